@@ -0,0 +1,219 @@
+"""Batch analysis of many positions over worker processes.
+
+BatchAnalyzer.analyze takes FEN strings, optionally paired with their own
+SearchLimits, and yields a PositionAnalysis per position, in input order or
+as soon as each search finishes. analyze_game does the same for every
+position of a game given as a move list. Each worker builds its Search and
+loads the opening book once, when it starts, and keeps them for every
+position it is handed, so the tables stay warm across a game. Positions and
+results travel packed through shared-memory rings (see ipc), not pickled.
+"""
+import multiprocessing
+import os
+import queue
+import struct
+
+from ipc import RingBuffer
+from move_generator import MoveGenerator
+from moves import move_from_uci, move_from_tuple, move_to_uci
+from opening_book import OpeningBook
+from position import Position, START_FEN, PACKED_SIZE
+from search import Search, SearchLimits, SearchResult, LIMITS_FORMAT, RESULT_FORMAT
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Book.txt')
+# Limits of positions given without their own
+DEFAULT_LIMITS = SearchLimits(depth=4)
+# How often a waiting analyze makes sure its workers are still alive (seconds)
+POLL_INTERVAL = 0.1
+
+# Task record: position index (STOP_INDEX ends the worker), then the packed
+# limits and position
+TASK_HEADER = struct.Struct('<Q')
+TASK_SIZE = TASK_HEADER.size + LIMITS_FORMAT.size + PACKED_SIZE
+STOP_INDEX = (1 << 64) - 1
+# Report record: position index, whether there is a result, number of book
+# moves, then the packed result and the most played book moves with their
+# play counts
+BOOK_MOVE_SLOTS = 8
+REPORT_HEADER = struct.Struct('<QBB')
+BOOK_FORMAT = struct.Struct(f'<{BOOK_MOVE_SLOTS}H{BOOK_MOVE_SLOTS}I')
+REPORT_SIZE = REPORT_HEADER.size + RESULT_FORMAT.size + BOOK_FORMAT.size
+# Positions in flight at a time, which is also the size of both rings
+RING_SLOTS = 64
+
+
+class PositionAnalysis:
+    """Search result for the position at index in the input. book_moves
+    lists the (move, times played) pairs of the opening book, if any."""
+    __slots__ = ('index', 'fen', 'result', 'book_moves')
+
+    def __init__(self, index, fen, result, book_moves):
+        self.index = index
+        self.fen = fen
+        self.result = result
+        self.book_moves = book_moves
+
+    def __repr__(self):
+        return f"PositionAnalysis(index={self.index}, fen={self.fen!r}, result={self.result})"
+
+
+def _load_book(book_path):
+    if not book_path or not os.path.exists(book_path):
+        return None
+    with open(book_path, 'r') as f:
+        return OpeningBook(file_content=f.read())
+
+
+def _book_moves(book, position):
+    """Legal book moves of position with their play counts, most played first"""
+    if book is None:
+        return []
+    entries = sorted(book.moves_by_key.get(book.book_key(position), []),
+                     key=lambda entry: entry.num_times_played, reverse=True)
+    legal = MoveGenerator(position).generate_moves()
+    book_moves = []
+    for entry in entries:
+        move = move_from_uci(legal, entry.move_string)
+        if move is not None:
+            book_moves.append((move, entry.num_times_played))
+    return book_moves[:BOOK_MOVE_SLOTS]
+
+
+def _worker_main(tasks, reports, hash_size_mb, book_path):
+    # Built once per worker and kept for every position it is handed
+    search = Search(hash_size_mb)
+    book = _load_book(book_path)
+    try:
+        while True:
+            task = tasks.get()
+            index, = TASK_HEADER.unpack_from(task)
+            if index == STOP_INDEX:
+                break
+            limits = SearchLimits.unpack(task, TASK_HEADER.size)
+            position = Position.unpack(task, TASK_HEADER.size + LIMITS_FORMAT.size)
+            book_moves = _book_moves(book, position)
+            result = search.search(position, limits)
+            padding = [0] * (BOOK_MOVE_SLOTS - len(book_moves))
+            reports.put(REPORT_HEADER.pack(index, result is not None, len(book_moves))
+                        + (result.pack() if result is not None else bytes(RESULT_FORMAT.size))
+                        + BOOK_FORMAT.pack(*(move for move, _ in book_moves), *padding,
+                                           *(count for _, count in book_moves), *padding))
+    finally:
+        tasks.close()
+        reports.close()
+
+
+def game_fens(moves, start_fen=START_FEN):
+    """FEN of the start position and of the position after each move.
+
+    Moves are UCI strings ("e2e4", "e7e8q") or the GUI's
+    ((file, rank), (file, rank)) tuples, which promote to a queen.
+    """
+    position = Position.from_fen(start_fen)
+    yield position.fen()
+    for played in moves:
+        legal = MoveGenerator(position).generate_moves()
+        if isinstance(played, str):
+            move = move_from_uci(legal, played)
+        else:
+            move = move_from_tuple(legal, *played)
+        if move is None:
+            raise ValueError(f"Illegal move {played!r} in {position.fen()}")
+        position.make_move(move)
+        yield position.fen()
+
+
+class BatchAnalyzer:
+    """Warm analysis worker processes. One analyze runs at a time; call
+    close() (or use it as a context manager) to stop the workers."""
+
+    def __init__(self, processes=None, hash_size_mb=16, book_path=BOOK_PATH):
+        context = multiprocessing.get_context()
+        self.tasks = RingBuffer(TASK_SIZE, RING_SLOTS)
+        self.reports = RingBuffer(REPORT_SIZE, RING_SLOTS)
+        self.workers = []
+        for _ in range(processes or os.cpu_count() or 1):
+            worker = context.Process(target=_worker_main, daemon=True,
+                                     args=(self.tasks, self.reports, hash_size_mb, book_path))
+            worker.start()
+            self.workers.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if not self.workers:
+            return
+        for _ in self.workers:
+            self.tasks.put(TASK_HEADER.pack(STOP_INDEX))
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        self.tasks.close()
+        self.reports.close()
+
+    def analyze(self, positions, limits=None, ordered=True):
+        """Yield a PositionAnalysis for every item of positions, a FEN or a
+        (FEN, SearchLimits) pair. Positions without limits of their own use
+        limits, or DEFAULT_LIMITS. With ordered=False results come out as
+        they finish."""
+        limits = limits or DEFAULT_LIMITS
+        items = enumerate(positions)
+        # FENs of the positions handed out and not reported yet, by index
+        pending = {}
+        # Reports waiting for an earlier position, when ordered
+        finished = {}
+        next_index = 0
+        exhausted = False
+        try:
+            while True:
+                # No more positions in flight than the report ring holds, so
+                # the workers never wait on it while this waits on them
+                while not exhausted and len(pending) < RING_SLOTS:
+                    try:
+                        index, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    fen, position_limits = item if isinstance(item, tuple) else (item, limits)
+                    task = TASK_HEADER.pack(index) + position_limits.pack() + Position.from_fen(fen).pack()
+                    pending[index] = fen
+                    self.tasks.put(task)
+                if not pending:
+                    break
+                analysis = self.receive(pending)
+                if not ordered:
+                    yield analysis
+                    continue
+                finished[analysis.index] = analysis
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+        finally:
+            # Collect what is still in flight when the caller stops early,
+            # so the next analyze starts with an empty report ring
+            while pending:
+                self.receive(pending)
+
+    def receive(self, pending):
+        """Wait for the next report and turn it into a PositionAnalysis"""
+        while True:
+            try:
+                report = self.reports.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("An analysis worker died")
+        index, has_result, book_count = REPORT_HEADER.unpack_from(report)
+        result = SearchResult.unpack(report, REPORT_HEADER.size) if has_result else None
+        book = BOOK_FORMAT.unpack_from(report, REPORT_HEADER.size + RESULT_FORMAT.size)
+        book_moves = [(move_to_uci(book[slot]), book[BOOK_MOVE_SLOTS + slot]) for slot in range(book_count)]
+        return PositionAnalysis(index, pending.pop(index), result, book_moves)
+
+    def analyze_game(self, moves, limits=None, ordered=True, start_fen=START_FEN):
+        """analyze every position of a game, from start_fen through the last move"""
+        # Replayed up front so an illegal move is reported here, not by a worker
+        return self.analyze(list(game_fens(moves, start_fen)), limits, ordered)
@@ -0,0 +1,193 @@
+"""Attack tables computed once at import.
+
+Squares use the board layout of position.py (a8 = 0, h1 = 63). Sliding pieces
+are looked up in occupancy-indexed tables: for every square the relevant
+blocker squares (the rays minus the board edge) are masked out of the
+occupancy and that masked value indexes a dict of precomputed attack sets,
+which is the magic bitboard scheme with the masked occupancy used directly as
+the key instead of a multiplied hash.
+"""
+
+KNIGHT_OFFSETS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_OFFSETS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _on_board(file, rank):
+    return 0 <= file < 8 and 0 <= rank < 8
+
+
+def _step_attacks(sq, offsets):
+    file, rank = sq & 7, sq >> 3
+    attacks = 0
+    for df, dr in offsets:
+        if _on_board(file + df, rank + dr):
+            attacks |= 1 << ((rank + dr) * 8 + file + df)
+    return attacks
+
+
+def _slide_attacks(sq, occupied, directions):
+    """Walk every ray until the first blocker (the blocker is included)"""
+    attacks = 0
+    for df, dr in directions:
+        file, rank = (sq & 7) + df, (sq >> 3) + dr
+        while _on_board(file, rank):
+            bit = 1 << (rank * 8 + file)
+            attacks |= bit
+            if occupied & bit:
+                break
+            file += df
+            rank += dr
+    return attacks
+
+
+def _relevant_mask(sq, directions):
+    """Squares whose occupancy can change the attack set (edges excluded)"""
+    mask = 0
+    for df, dr in directions:
+        file, rank = (sq & 7) + df, (sq >> 3) + dr
+        while _on_board(file + df, rank + dr):
+            mask |= 1 << (rank * 8 + file)
+            file += df
+            rank += dr
+    return mask
+
+
+def _build_slider_table(directions):
+    masks = []
+    tables = []
+    for sq in range(64):
+        mask = _relevant_mask(sq, directions)
+        table = {}
+        # Enumerate every subset of the mask (Carry-Rippler trick)
+        subset = 0
+        while True:
+            table[subset] = _slide_attacks(sq, subset, directions)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+KNIGHT_ATTACKS = [_step_attacks(sq, KNIGHT_OFFSETS) for sq in range(64)]
+KING_ATTACKS = [_step_attacks(sq, KING_OFFSETS) for sq in range(64)]
+# White pawns move towards rank 0 of the board layout, black pawns towards rank 7
+PAWN_ATTACKS = {
+    'w': [_step_attacks(sq, ((-1, -1), (1, -1))) for sq in range(64)],
+    'b': [_step_attacks(sq, ((-1, 1), (1, 1))) for sq in range(64)],
+}
+
+ROOK_MASKS, ROOK_TABLES = _build_slider_table(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_TABLES = _build_slider_table(BISHOP_DIRECTIONS)
+
+# Attacks on an empty board, used for quick alignment tests
+ROOK_PSEUDO_ATTACKS = [ROOK_TABLES[sq][0] for sq in range(64)]
+BISHOP_PSEUDO_ATTACKS = [BISHOP_TABLES[sq][0] for sq in range(64)]
+
+
+def rook_attacks(sq, occupied):
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+
+
+def bishop_attacks(sq, occupied):
+    return BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def queen_attacks(sq, occupied):
+    return (ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+            | BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]])
+
+
+def _build_line_tables():
+    """BETWEEN[a][b]: squares strictly between a and b; LINE[a][b]: the full line through both"""
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for b in range(64):
+            if a == b:
+                continue
+            bit_a, bit_b = 1 << a, 1 << b
+            for pseudo, attacks in ((ROOK_PSEUDO_ATTACKS, rook_attacks),
+                                    (BISHOP_PSEUDO_ATTACKS, bishop_attacks)):
+                if pseudo[a] & bit_b:
+                    between[a][b] = attacks(a, bit_b) & attacks(b, bit_a)
+                    line[a][b] = (pseudo[a] & pseudo[b]) | bit_a | bit_b
+    return between, line
+
+
+BETWEEN, LINE = _build_line_tables()
+
+
+class AttackMap:
+    """Squares attacked by each side, computed once per position.
+
+    by_piece[piece] is the union of the attacks of every piece with that code,
+    by_color[color] the union over the whole side (defended_by[color] leaves
+    the king out). The attack set of every single piece is kept as well so
+    attacker_count() can count the attackers of a square without a rescan.
+    mobility[color] counts the squares the side's knights, bishops, rooks and
+    queens attack that are not taken by their own pieces.
+    """
+
+    def __init__(self, position):
+        bb = position.bitboards
+        occupied = position.occupied
+        self.by_piece = {}
+        self.by_color = {}
+        self.defended_by = {}
+        self.piece_attacks = {}
+        self.mobility = {}
+        for color in ('w', 'b'):
+            pawn_attacks = PAWN_ATTACKS[color]
+            piece_attacks = []
+            side = 0
+            mobility = 0
+            not_own = ~position.occupancy[color]
+            for piece_type in ('P', 'N', 'B', 'R', 'Q', 'K'):
+                piece = color + piece_type
+                mask = 0
+                pieces = bb[piece]
+                while pieces:
+                    low = pieces & -pieces
+                    sq = low.bit_length() - 1
+                    pieces ^= low
+                    if piece_type == 'P':
+                        attacks = pawn_attacks[sq]
+                    elif piece_type == 'N':
+                        attacks = KNIGHT_ATTACKS[sq]
+                    elif piece_type == 'B':
+                        attacks = BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+                    elif piece_type == 'R':
+                        attacks = ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+                    elif piece_type == 'Q':
+                        attacks = (ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+                                   | BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]])
+                    else:
+                        attacks = KING_ATTACKS[sq]
+                    if piece_type in 'NBRQ':
+                        mobility += (attacks & not_own).bit_count()
+                    mask |= attacks
+                    piece_attacks.append(attacks)
+                self.by_piece[piece] = mask
+                if piece_type == 'K':
+                    self.defended_by[color] = side
+                side |= mask
+            self.by_color[color] = side
+            self.piece_attacks[color] = piece_attacks
+            self.mobility[color] = mobility
+
+    def is_attacked(self, sq, by_color):
+        return bool(self.by_color[by_color] >> sq & 1)
+
+    def is_defended(self, sq, color):
+        """Whether a piece of color other than the king covers sq"""
+        return bool(self.defended_by[color] >> sq & 1)
+
+    def attacker_count(self, sq, by_color):
+        """Number of by_color pieces attacking sq"""
+        if not self.by_color[by_color] >> sq & 1:
+            return 0
+        return sum(attacks >> sq & 1 for attacks in self.piece_attacks[by_color])
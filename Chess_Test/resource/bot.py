@@ -1,15 +1,91 @@
-import math
 import random
-import time
+import threading
 from opening_book import OpeningBook
-from evaluation import Evaluation, PIECE_VALUES
+from evaluation import Evaluation
+from move_generator import MoveGenerator
+from moves import move_to_tuple, move_to_uci
+from position import Position
+from search import Search, SearchLimits
+from smp import ParallelSearch
+
+# Thinking time per move when make_move is given no limit (seconds)
+DEFAULT_MOVETIME = 5
+# How far a board may be from the last one the bot saw and still continue
+# its game: moves back (a missed ponder reply) and moves ahead
+GAME_PLIES_BACK = 2
+GAME_PLIES_AHEAD = 2
+
+
+def bot_limits(time_left=None, increment=0.0, moves_to_go=None, movetime=None, depth=None, nodes=None):
+    """SearchLimits of a bot move, DEFAULT_MOVETIME when nothing is given"""
+    limits = SearchLimits(time_left, increment, moves_to_go, movetime, depth, nodes)
+    if limits.is_infinite():
+        limits.movetime = DEFAULT_MOVETIME
+    return limits
+
+
+class BackgroundMove:
+    """A bot move being chosen on a daemon thread.
+
+    The GUI polls done() every frame and reads move once it is; stop() ends
+    the search early with the best move found so far. The board is copied
+    before the thread starts, so the caller may keep drawing it.
+
+    A ponder search is given a board on which ponder_move, the opponent's
+    expected reply, is already played, and ignores the clock until
+    ponderhit() tells it the reply was played.
+    """
+
+    def __init__(self, bot, board, turn, castling_rights, last_move, limits, ponder_move=None):
+        self.stop_event = threading.Event()
+        self.ponder_move = ponder_move
+        self.ponderhit_event = threading.Event() if ponder_move is not None else None
+        self.board = [row[:] for row in board]
+        self.turn = turn
+        self.move = None
+        self.thread = threading.Thread(
+            target=self.run, daemon=True,
+            args=(bot, [row[:] for row in board], turn, castling_rights, last_move, limits))
+        self.thread.start()
+
+    def run(self, bot, board, turn, castling_rights, last_move, limits):
+        self.move = bot.choose_move(board, turn, castling_rights, last_move, limits, self.stop_event,
+                                    self.ponderhit_event)
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def matches(self, board, turn):
+        """Whether this search is on the position of board.
+
+        Only the pieces and the side to move are compared: both come from
+        the same position one move earlier, so the same board means the
+        same move, while the GUI's castling rights bookkeeping may differ
+        from the ones the search derived.
+        """
+        return turn == self.turn and board == self.board
+
+    def ponderhit(self):
+        self.ponderhit_event.set()
+
 
 class ChessBot:
-    def __init__(self, move_validator):
+    def __init__(self, move_validator, hash_size_mb=16, threads=1):
         self.move_validator = move_validator
         self.evaluator = Evaluation(move_validator)
-        self.killer_moves = {}
-        self.history_table = {}
+        # Transposition table and ordering tables are kept from move to move;
+        # more than one thread searches in that many worker processes
+        if threads > 1:
+            self.search = ParallelSearch(threads, hash_size_mb)
+        else:
+            self.search = Search(hash_size_mb, self.evaluator)
+        # Principal variation behind the last move chosen, empty for book and random moves
+        self.last_pv = []
+        # The game as the bot has followed it, for repetitions (see game_position)
+        self.game = None
         
         try:
             self.opening_book = OpeningBook(file_path=r"D:\Chess_Test\resource\Book.txt")
@@ -17,27 +93,133 @@ class ChessBot:
             print(r"Error: Could not find Book.txt at D:\Chess_Test\resource\Book.txt")
             self.opening_book = None
 
-    def make_move(self, board, turn, castling_rights, last_move):
-        start_time = time.time()
-        max_time = 5  # Increased time for move calculation (seconds)
+    def close(self):
+        """Stop the worker processes and free the shared table of a parallel search.
+        No search may be running."""
+        if isinstance(self.search, ParallelSearch):
+            self.search.close()
+
+    def make_move(self, board, turn, castling_rights, last_move, time_left=None, increment=0.0,
+                  moves_to_go=None, movetime=None, depth=None, nodes=None):
+        """Play the bot's move on board.
+
+        The search is limited by the clock (time_left, increment and
+        moves_to_go), a fixed movetime, a depth or a node count; times are in
+        seconds. Without any limit it thinks for DEFAULT_MOVETIME seconds.
+        """
+        limits = bot_limits(time_left, increment, moves_to_go, movetime, depth, nodes)
+        move = self.choose_move(board, turn, castling_rights, last_move, limits)
+        if move is None:
+            return False
+        position = Position.from_board(board, turn, castling_rights, last_move)
+        self.execute_move(board, position, move)
+        return True
+
+    def start_move(self, board, turn, castling_rights, last_move, time_left=None, increment=0.0,
+                   moves_to_go=None, movetime=None, depth=None, nodes=None):
+        """Start choosing the bot's move on a background thread and return the
+        BackgroundMove to poll; board is left untouched. Limits as in make_move."""
+        limits = bot_limits(time_left, increment, moves_to_go, movetime, depth, nodes)
+        return BackgroundMove(self, board, turn, castling_rights, last_move, limits)
+
+    def start_ponder(self, board, turn, castling_rights, last_move, time_left=None, increment=0.0,
+                     moves_to_go=None, movetime=None, depth=None, nodes=None):
+        """Predict the opponent's reply on board and start searching the position
+        after it on a background thread, with the limits of the bot's next move.
+
+        Returns the BackgroundMove, or None without a prediction. If the
+        opponent plays ponder_move, call its ponderhit() and use it as the
+        bot's search; otherwise stop it and wait until it is done before
+        starting another search.
+        """
+        position = Position.from_board(board, turn, castling_rights, last_move)
+        reply = self.predict_reply(position)
+        if reply is None:
+            return None
+        print(f"[Bot] Pondering on {move_to_uci(reply)}")
+        position.make_move(reply)
+        limits = bot_limits(time_left, increment, moves_to_go, movetime, depth, nodes)
+        return BackgroundMove(self, position.to_board(), position.turn, position.castling_rights,
+                              move_to_tuple(reply), limits, ponder_move=reply)
+
+    def predict_reply(self, position):
+        """The opponent's expected move: the one after ours in the last principal
+        variation, else the book's most played move"""
+        if len(self.last_pv) >= 2 and self.last_pv[1] in MoveGenerator(position).generate_moves():
+            return self.last_pv[1]
+        if self.opening_book:
+            return self.opening_book.most_played_move(position)
+        return None
+
+    def choose_move(self, board, turn, castling_rights, last_move, limits, stop_event=None,
+                    ponderhit_event=None):
+        """The bot's move (None if it has none), without playing it"""
         bot_color = 'b'  # Assuming bot plays black
+        self.last_pv = []
+        position = self.game_position(board, turn, castling_rights, last_move)
 
         # 1. Try opening book first
-        if self.opening_book and self.try_opening_book_move(board, turn, castling_rights, last_move, bot_color):
-            return True
+        if self.opening_book:
+            book_move = self.try_opening_book_move(board, turn, castling_rights, last_move, bot_color)
+            if book_move:
+                return book_move
 
         # 2. Use Alpha-Beta search if no book move found
         print("[Bot] Starting Alpha-Beta search...")
-        best_move = self.find_best_move_with_alphabeta(board, bot_color, start_time, max_time)
+        best_move = self.find_best_move(position, limits, stop_event, ponderhit_event)
         
         if best_move:
-            score = self.evaluator.evaluate(board, bot_color)
-            print(f"[Bot] Best move found: {best_move}, Evaluation score: {score}")
-            self.execute_move(board, best_move[0], best_move[1])
-            return True
+            score = self.evaluator.evaluate(position, bot_color)
+            print(f"[Bot] Best move found: {move_to_uci(best_move)}, Evaluation score: {score}")
+            return best_move
         
         # Fallback to random move if no valid move found
-        return self.fallback_to_random_move(board, bot_color)
+        return self.fallback_to_random_move(position, bot_color)
+
+    def game_position(self, board, turn, castling_rights, last_move):
+        """Position of board, with the keys of the game that led to it so the
+        search sees repetitions of positions played before.
+
+        The GUI only hands over boards, so the bot follows the game itself:
+        a board a few moves on from the last one it saw (or from a move or two
+        before that, after a missed ponder) continues that game, any other
+        board starts a new one.
+        """
+        position = Position.from_board(board, turn, castling_rights, last_move)
+        game = self.follow_game(position)
+        self.game = game if game is not None else position.copy()
+        # The GUI's castling rights and en passant square, the game's history
+        position.set_history(self.game.key_history)
+        position.halfmove_clock = self.game.halfmove_clock
+        position.fullmove_number = self.game.fullmove_number
+        return position
+
+    def follow_game(self, position):
+        """self.game played on to the pieces and side to move of position, or None"""
+        if self.game is None:
+            return None
+        game = self.game.copy()
+        for _ in range(GAME_PLIES_BACK + 1):
+            found = self.play_to(game, position, GAME_PLIES_AHEAD)
+            if found is not None:
+                return found
+            if not game.undo_stack:
+                break
+            game.unmake_move()
+        return None
+
+    def play_to(self, game, position, plies):
+        """Copy of game after up to plies moves that lead to position, or None"""
+        if game.side_to_move == position.side_to_move and game.bitboards == position.bitboards:
+            return game.copy()
+        if plies:
+            for move in MoveGenerator(game).generate_moves():
+                game.make_move(move)
+                found = self.play_to(game, position, plies - 1)
+                game.unmake_move()
+                if found is not None:
+                    return found
+        return None
 
     def try_opening_book_move(self, board, turn, castling_rights, last_move, color):
         try:
@@ -50,214 +232,49 @@ class ChessBot:
                 weight_pow=0.5  # Adjusted to prefer more common moves
             )
             if book_move:
-                print(f"[Bot] Using book move: {book_move}")
-                self.execute_move(board, book_move[0], book_move[1])
-                return True
+                print(f"[Bot] Using book move: {move_to_uci(book_move)}")
+                return book_move
         except Exception as e:
             print(f"[Bot] Book error: {str(e)}")
-        return False
-
-    def find_best_move_with_alphabeta(self, board, color, start_time, max_time):
-        best_move = None
-        best_score = -math.inf
-        
-        # Iterative deepening (reduced max depth to 5 to avoid timeout)
-        for depth in range(2, 6):
-            if time.time() - start_time > max_time:
-                break
-                
-            try:
-                score, move = self.alphabeta_search(
-                    board=board,
-                    depth=depth,
-                    kappa=-math.inf,
-                    beta=math.inf,
-                    maximizing_player=True,
-                    current_color=color,
-                    start_time=start_time,
-                    max_time=max_time
-                )
-                
-                if move and score > best_score:
-                    best_move = move
-                    best_score = score
-                    print(f"[Bot] Depth {depth}: move {move} score {score}")
-            except TimeoutError:
-                print(f"[Bot] Depth {depth} search timed out")
-                break
+        return None
 
-        return best_move
-
-    def alphabeta_search(self, board, depth, kappa, beta, maximizing_player, current_color, start_time, max_time):
-        """Alpha-Beta search implementation"""
-        if time.time() - start_time > max_time:
-            raise TimeoutError()
-            
-        # Check terminal node (leaf node or game over)
-        if depth == 0 or self.is_terminal_node(board, current_color):
-            return self.evaluator.evaluate(board, current_color), None
-            
-        # Get and order legal moves
-        moves = self.get_ordered_moves(board, current_color, depth)
-        
-        best_move = None
-        best_value = -math.inf if maximizing_player else math.inf
-        
-        for move in moves:
-            new_board = self.copy_board(board)
-            self.execute_move(new_board, move[0], move[1])
-            
-            # Recursive Alpha-Beta search
-            value, _ = self.alphabeta_search(
-                new_board, depth-1, kappa, beta,
-                not maximizing_player,
-                'w' if current_color == 'b' else 'b',
-                start_time, max_time
-            )
-            
-            # Update best value and move
-            if maximizing_player:
-                if value > best_value:
-                    best_value = value
-                    best_move = move
-                    kappa = max(kappa, best_value)
+    def find_best_move(self, position, limits, stop_event=None, ponderhit_event=None):
+        """Search position and return the best move found, printing every iteration"""
+        result = None
+        for result in self.search.iterate(position, limits, stop_event, ponderhit_event=ponderhit_event):
+            pv = ' '.join(move_to_uci(move) for move in result.pv)
+            if result.complete:
+                print(f"[Bot] Depth {result.depth}: move {move_to_uci(result.move)} "
+                      f"score {result.score} pv {pv}")
             else:
-                if value < best_value:
-                    best_value = value
-                    best_move = move
-                    beta = min(beta, best_value)
-                    
-            # Alpha-Beta pruning
-            if beta <= kappa:
-                self.store_killer_move(move, depth)
-                break
-                
-        return best_value, best_move
-
-    def is_terminal_node(self, board, color):
-        """Check if node is terminal (checkmate/stalemate)"""
-        if not self.get_all_valid_moves(board, color):
-            return True
-        return False
-
-    def get_ordered_moves(self, board, color, depth):
-        """Get and order moves for better Alpha-Beta performance"""
-        moves = self.get_all_valid_moves(board, color)
-        return self.order_moves(board, moves, depth, color)
-
-    def order_moves(self, board, moves, depth, color):
-        """Order moves using various heuristics"""
-        scored_moves = []
-        for move in moves:
-            start, end = move
-            piece = board[start[1]][start[0]]
-            target = board[end[1]][end[0]]
-            score = 0
-            
-            # Check if move leaves king in check
-            temp_board = self.copy_board(board)
-            self.execute_move(temp_board, start, end)
-            if self.move_validator.is_king_in_check(temp_board, color):
-                score -= 1000  # Heavy penalty for moves leaving king in check
-                continue  # Skip invalid moves
-            
-            # Capture heuristic
-            if target:
-                score += 10 * PIECE_VALUES.get(target[1], 0) - PIECE_VALUES.get(piece[1], 0)
-            
-            # Exchange heuristic
-            score += self.evaluator.exchange_score(board, color, start, end) * 5
-            
-            # Killer move heuristic
-            if self.is_killer_move(move, depth):
-                score += 100
-                
-            # History heuristic
-            score += self.history_table.get(move, 0) * 2
-            
-            # Promotion heuristic
-            if piece[1] == 'P' and (end[1] == 0 or end[1] == 7):
-                score += 500
-                
-            # Castling heuristic
-            if piece[1] == 'K' and abs(end[0] - start[0]) == 2:
-                score += 200  # Prioritize castling
-                
-            # Penalty for moving to attacked square
-            if self.evaluator.is_piece_attacked(temp_board, end, color):
-                score -= PIECE_VALUES.get(piece[1], 0) // 2
-                
-            # Penalty for moving queen to attacked square
-            if piece[1] == 'Q':
-                if self.evaluator.is_piece_attacked(temp_board, end, color):
-                    score -= 300  # Heavy penalty for moving queen to danger
-                    
-            # Penalty for queen exchange
-            if target and target[1] == 'Q' and piece[1] == 'Q':
-                score -= 100
-                material_score = self.evaluator.material_score(board, color)
-                if material_score > 300:
-                    score += 50
-                    
-            scored_moves.append((score, move))
-        
-        # Sort moves by score (highest first)
-        scored_moves.sort(reverse=True, key=lambda x: x[0])
-        return [move for score, move in scored_moves]
-
-    def is_killer_move(self, move, depth):
-        """Check if move is a killer move for this depth"""
-        return depth in self.killer_moves and move in self.killer_moves[depth]
-
-    def store_killer_move(self, move, depth):
-        """Store a new killer move for this depth"""
-        if depth not in self.killer_moves:
-            self.killer_moves[depth] = []
-        if move not in self.killer_moves[depth]:
-            if len(self.killer_moves[depth]) >= 2:
-                self.killer_moves[depth].pop()
-            self.killer_moves[depth].insert(0, move)
-
-    def get_all_valid_moves(self, board, color):
+                print(f"[Bot] Depth {result.depth} search cut off, "
+                      f"keeping {move_to_uci(result.move)} score {result.score}")
+        if result is None:
+            return None
+        print(f"[Bot] {result.nodes} nodes in {result.elapsed:.2f}s ({result.nps} nps)")
+        tt = self.search.transposition_table
+        print(f"[Bot] TT hit rate {tt.hit_rate():.1%}, fill {tt.fill():.1%}")
+        self.last_pv = result.pv
+        return result.move
+
+    def get_all_valid_moves(self, position, color):
         """Get all valid moves for current color"""
-        moves = []
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece and piece[0] == color:
-                    valid_moves = self.move_validator.get_all_valid_moves((file, rank))
-                    for move in valid_moves:
-                        # Verify move doesn't leave king in check
-                        temp_board = self.copy_board(board)
-                        self.execute_move(temp_board, (file, rank), move)
-                        if not self.move_validator.is_king_in_check(temp_board, color):
-                            moves.append(((file, rank), move))
-        return moves
-
-    def execute_move(self, board, start_pos, end_pos):
-        """Execute a move on the board"""
-        start_file, start_rank = start_pos
-        end_file, end_rank = end_pos
-        piece = board[start_rank][start_file]
-        board[end_rank][end_file] = piece
-        board[start_rank][start_file] = ''
-        # Handle pawn promotion
-        if piece and piece[1] == 'P' and (end_rank == 0 or end_rank == 7):
-            board[end_rank][end_file] = piece[0] + 'Q'
-        # Check if king is in check (for debugging only)
-        if self.move_validator.is_king_in_check(board, piece[0]):
-            print(f"[Warning] Move {start_pos}->{end_pos} leaves king in check!")
-
-    def fallback_to_random_move(self, board, color):
+        # The generator only emits legal moves, so no trial move is needed here
+        return MoveGenerator(position).generate_moves()
+
+    def execute_move(self, board, position, move):
+        """Play move on position (the position of board) and copy the result into board"""
+        # make_move follows the move's flags: the rook of a castling move, the
+        # pawn taken en passant and the chosen promotion piece
+        position.make_move(move)
+        for rank, row in enumerate(position.to_board()):
+            board[rank][:] = row
+
+    def fallback_to_random_move(self, position, color):
         """Fallback to random move if no better move found"""
-        all_moves = self.get_all_valid_moves(board, color)
+        all_moves = self.get_all_valid_moves(position, color)
         if all_moves:
             random_move = random.choice(all_moves)
-            print(f"[Bot] Using random move: {random_move}")
-            self.execute_move(board, random_move[0], random_move[1])
-            return True
-        return False
-
-    def copy_board(self, board):
-        """Create a deep copy of the board"""
-        return [row[:] for row in board]
\ No newline at end of file
+            print(f"[Bot] Using random move: {move_to_uci(random_move)}")
+            return random_move
+        return None
\ No newline at end of file
@@ -1,3 +1,6 @@
+from attacks import AttackMap
+from position import square
+
 PIECE_VALUES = {
     'P': 100, 'N': 300, 'B': 320, 'R': 500, 'Q': 900, 'K': 20000
 }
@@ -5,6 +8,11 @@ PIECE_VALUES = {
 PASSED_PAWN_BONUSES = [0, 120, 80, 50, 30, 15, 15]
 ISOLATED_PAWN_PENALTY_BY_COUNT = [0, -10, -25, -50, -75, -75, -75, -75, -75]
 KING_PAWN_SHIELD_SCORES = [4, 7, 4, 3, 6, 3]
+# Positions remembered by evaluate() before the cache is emptied
+EVAL_CACHE_SIZE = 1 << 16
+# Non-king material of both sides together at or below which the endgame
+# tables apply
+ENDGAME_MATERIAL = 6000
 
 POSITION_TABLES = {
     'P': [
@@ -90,86 +98,96 @@ POSITION_TABLES = {
 }
 
 class Evaluation:
-    def __init__(self, move_validator):
+    def __init__(self, move_validator=None):
         self.validator = move_validator
+        # White's scores by Zobrist key
+        self.eval_cache = {}
+        # Pawn structure scores by (color, white pawns, black pawns)
+        self.pawn_cache = {}
 
-    def evaluate(self, board, color):
-        material = self.material_score(board, color)
-        game_phase = 0 if material > 3000 else 1
-        score = material
-        score += self.position_score(board, color, game_phase)
-        score += self.mobility_score(board, color) * 0.1
-        score += self.pawn_structure_score(board, color) * 0.05
-        score += self.king_safety_score(board, color, game_phase) * 0.3
-        score += self.piece_development_score(board, color, game_phase) * 0.2
-        score += self.piece_protection_score(board, color) * 0.15
-        score += self.center_control_score(board, color) * 0.1
-        return score
+    def evaluate(self, position, color):
+        """Score of position for color, the negation of the other color's score"""
+        cache = self.eval_cache
+        score = cache.get(position.key)
+        if score is None:
+            if len(cache) >= EVAL_CACHE_SIZE:
+                cache.clear()
+            score = cache[position.key] = self.evaluate_position(position, 'w')
+        return score if color == 'w' else -score
 
-    def material_score(self, board, color):
-        score = 0
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece:
-                    val = PIECE_VALUES.get(piece[1], 0)
-                    if piece[0] == color:
-                        score += val
-                    else:
-                        score -= val
+    def evaluate_position(self, position, color):
+        """Material balance plus color's positional terms minus the opponent's"""
+        opponent_color = 'w' if color == 'b' else 'b'
+        # One attack map shared by every attack-based term
+        attack_map = AttackMap(position)
+        game_phase = self.game_phase(position)
+        return (self.material_score(position, color)
+                + self.side_score(position, color, game_phase, attack_map)
+                - self.side_score(position, opponent_color, game_phase, attack_map))
+
+    def game_phase(self, position):
+        """0 in the middlegame, 1 in the endgame; the same for both sides"""
+        material = 0
+        for piece_type in ('P', 'N', 'B', 'R', 'Q'):
+            material += PIECE_VALUES[piece_type] * (len(position.piece_lists['w' + piece_type])
+                                                    + len(position.piece_lists['b' + piece_type]))
+        return 0 if material > ENDGAME_MATERIAL else 1
+
+    def side_score(self, position, color, game_phase, attack_map):
+        """Positional terms of color's pieces alone"""
+        score = self.position_score(position, color, game_phase)
+        score += self.mobility_score(position, color, attack_map) * 0.1
+        score += self.pawn_score(position, color) * 0.05
+        score += self.king_safety_score(position, color, game_phase, attack_map) * 0.3
+        score += self.piece_development_score(position, color, game_phase) * 0.2
+        score += self.piece_protection_score(position, color, attack_map) * 0.15
+        score += self.center_control_score(position, color, attack_map) * 0.1
         return score
 
-    def exchange_score(self, board, color, start_pos, end_pos):
-        target_piece = board[end_pos[1]][end_pos[0]]
-        if not target_piece:
-            return 0
-        score = PIECE_VALUES.get(target_piece[1], 0)
-        temp_board = [row[:] for row in board]
-        temp_board[end_pos[1]][end_pos[0]] = board[start_pos[1]][start_pos[0]]
-        temp_board[start_pos[1]][start_pos[0]] = ''
-        if self.is_piece_attacked(temp_board, end_pos, color):
-            score -= PIECE_VALUES.get(board[start_pos[1]][start_pos[0]][1], 0)
+    def material_score(self, position, color):
+        opponent_color = 'w' if color == 'b' else 'b'
+        score = 0
+        for piece_type, val in PIECE_VALUES.items():
+            score += val * (len(position.piece_lists[color + piece_type])
+                            - len(position.piece_lists[opponent_color + piece_type]))
         return score
 
-    def position_score(self, board, color, game_phase):
+    def position_score(self, position, color, game_phase):
         score = 0
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece and piece[0] == color:
-                    idx = rank * 8 + file
-                    if color == 'b':
-                        idx = 63 - idx
-                    ptype = piece[1]
-                    if ptype == 'K':
-                        key = 'K_end' if game_phase == 1 else 'K_middle'
-                        score += POSITION_TABLES[key][idx]
-                    elif ptype == 'P':
-                        pscore = (1 - game_phase) * POSITION_TABLES['P'][idx] + game_phase * POSITION_TABLES['P_end'][idx]
-                        score += pscore
-                    elif ptype in POSITION_TABLES:
-                        score += POSITION_TABLES[ptype][idx]
+        for piece, idx in position.piece_squares(color):
+            if color == 'b':
+                idx ^= 56  # Same file, rank seen from Black's side
+            ptype = piece[1]
+            if ptype == 'K':
+                key = 'K_end' if game_phase == 1 else 'K_middle'
+                score += POSITION_TABLES[key][idx]
+            elif ptype == 'P':
+                pscore = (1 - game_phase) * POSITION_TABLES['P'][idx] + game_phase * POSITION_TABLES['P_end'][idx]
+                score += pscore
+            elif ptype in POSITION_TABLES:
+                score += POSITION_TABLES[ptype][idx]
         return score
 
-    def mobility_score(self, board, color):
-        moves = 0
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece and piece[0] == color:
-                    moves += len(self.validator.get_all_valid_moves((file, rank)))
-        return moves
+    def mobility_score(self, position, color, attack_map):
+        # Squares reached by the pieces, from the attack map instead of a move generation
+        return attack_map.mobility[color]
 
-    def pawn_structure_score(self, board, color):
-        pawns = []
-        opponent_pawns = []
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece == color + 'P':
-                    pawns.append((file, rank))
-                elif piece and piece[0] != color and piece[1] == 'P':
-                    opponent_pawns.append((file,rank))
+    def pawn_score(self, position, color):
+        """pawn_structure_score, cached: it only depends on the pawns, which move far less often than the pieces"""
+        bb = position.bitboards
+        pawn_key = (color, bb['wP'], bb['bP'])
+        cache = self.pawn_cache
+        score = cache.get(pawn_key)
+        if score is None:
+            if len(cache) >= EVAL_CACHE_SIZE:
+                cache.clear()
+            score = cache[pawn_key] = self.pawn_structure_score(position, color)
+        return score
+
+    def pawn_structure_score(self, position, color):
+        opponent_color = 'w' if color == 'b' else 'b'
+        pawns = {(sq & 7, sq >> 3) for sq in position.piece_lists[color + 'P']}
+        opponent_pawns = [(sq & 7, sq >> 3) for sq in position.piece_lists[opponent_color + 'P']]
 
         score = 0
         for file, rank in pawns:
@@ -200,29 +218,19 @@ class Evaluation:
                     break
         return score
 
-    def king_safety_score(self, board, color, game_phase):
+    def king_safety_score(self, position, color, game_phase, attack_map):
+        board = position.board
         score = 0
-        king_pos = None
-    
-        # Find king position
-        for rank in range(8):
-            for file in range(8):
-                if board[rank][file] == color + 'K':
-                    king_pos = (file, rank)
-                    break
-            if king_pos:
-                break
-        
-        if not king_pos:
+        king_sq = position.king_squares[color]
+        if king_sq is None:
             return 0
+        king_pos = (king_sq & 7, king_sq >> 3)
         
-        # Check if king is in check
-        in_check = self.validator.is_king_in_check(board, color)
-        if in_check:
+        # Count attackers; any attacker means the king is in check
+        attacker_count = self.count_king_attackers(attack_map, king_pos, color)
+        if attacker_count:
             score -= 150
         
-        # Count attackers
-        attacker_count = self.count_king_attackers(board, king_pos, color)
         score -= attacker_count * 40
         
         # Evaluate pawn shield
@@ -235,18 +243,9 @@ class Evaluation:
             
         return score
 
-    def count_king_attackers(self, board, king_pos, color):
+    def count_king_attackers(self, attack_map, king_pos, color):
         opponent_color = 'w' if color == 'b' else 'b'
-        attackers = 0
-        king_file, king_rank = king_pos
-    
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece and piece[0] == opponent_color:
-                    if (king_file, king_rank) in self.validator.get_all_valid_moves((file, rank)):
-                        attackers += 1
-        return attackers
+        return attack_map.attacker_count(square(*king_pos), opponent_color)
 
     def evaluate_pawn_shield(self, board, king_pos, color):
         file, rank = king_pos
@@ -274,30 +273,23 @@ class Evaluation:
                 break
         return open_file
 
-    def piece_development_score(self, board, color, game_phase):
+    def piece_development_score(self, position, color, game_phase):
         if game_phase == 1:
             return 0
+        board = position.board
         score = 0
         
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece and piece[0] == color:
-                    if piece[1] in ['N', 'B']:
-                        if (color == 'w' and rank < 7) or (color == 'b' and rank > 0):
-                            score += 30  # Increased bonus for developing knights and bishops
-                    elif piece[1] == 'Q':
-                        if (color == 'w' and rank < 7) or (color == 'b' and rank > 0):
-                            score -= 30
+        for piece_type in ('N', 'B', 'Q'):
+            for sq in position.piece_lists[color + piece_type]:
+                rank = sq >> 3
+                if (color == 'w' and rank < 7) or (color == 'b' and rank > 0):
+                    if piece_type == 'Q':
+                        score -= 30
+                    else:
+                        score += 30  # Increased bonus for developing knights and bishops
                             
-        king_pos = None
-        for rank in range(8):
-            for file in range(8):
-                if board[rank][file] == color + 'K':
-                    king_pos = (file, rank)
-                    break
-            if king_pos:
-                break
+        king_sq = position.king_squares[color]
+        king_pos = (king_sq & 7, king_sq >> 3) if king_sq is not None else None
         if king_pos:
             file, rank = king_pos
             if (color == 'w' and rank == 7 and (file in [2, 6])) or \
@@ -316,44 +308,16 @@ class Evaluation:
         
         return score
     
-    def piece_protection_score(self, board, color):
+    def piece_protection_score(self, position, color, attack_map):
+        # Hanging pieces are left to the quiescence search
         score = 0
-        for rank in range(8):
-            for file in range(8):
-                piece = board[rank][file]
-                if piece and piece[0] == color:
-                    protected = self.is_piece_protected(board, (file, rank), color)
-                    if protected:
-                        score += 15  # Increased bonus for protected pieces
-                    piece_value = PIECE_VALUES.get(piece[1], 0)
-                    if piece_value > 300 and self.is_piece_attacked(board, (file, rank), color):
-                        score -= piece_value // 2  # Heavier penalty for attacked high-value pieces
-                    if piece[1] == 'Q' and self.is_piece_attacked(board, (file, rank), color):
-                        score -= 200  # Extra penalty for attacked queen
+        for piece, sq in position.piece_squares(color):
+            if attack_map.is_defended(sq, color):
+                score += 15  # Increased bonus for protected pieces
         return score
 
-    def is_piece_protected(self, board, pos, color):
-        file, rank = pos
-        for r in range(8):
-            for f in range(8):
-                piece = board[r][f]
-                if piece and piece[0] == color and piece[1] != 'K':
-                    if (file, rank) in self.validator.get_all_valid_moves((f, r)):
-                        return True
-        return False
-
-    def is_piece_attacked(self, board, pos, color):
-        opponent_color = 'w' if color == 'b' else 'b'
-        file, rank = pos
-        for r in range(8):
-            for f in range(8):
-                piece = board[r][f]
-                if piece and piece[0] == opponent_color:
-                    if (file, rank) in self.validator.get_all_valid_moves((f, r)):
-                        return True
-        return False
-    
-    def center_control_score(self, board, color):
+    def center_control_score(self, position, color, attack_map):
+        board = position.board
         center_squares = [(3,3), (3,4), (4,3), (4,4)]
         score = 0
         for file, rank in center_squares:
@@ -362,10 +326,5 @@ class Evaluation:
                 score += 15
                 if piece[1] == 'Q':
                     score += 30  # Extra bonus for queen in center
-            for r in range(8):
-                for f in range(8):
-                    piece = board[r][f]
-                    if piece and piece[0] == color:
-                        if (file, rank) in self.validator.get_all_valid_moves((f, r)):
-                            score += 10
-        return score
\ No newline at end of file
+            score += 10 * attack_map.attacker_count(square(file, rank), color)
+        return score
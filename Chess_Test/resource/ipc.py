@@ -0,0 +1,80 @@
+"""Shared-memory ring buffer of fixed-size records.
+
+Positions, search limits and search results all pack into fixed-size byte
+strings (Position.pack, SearchLimits.pack, SearchResult.pack), so they can go
+from one process to another by copying bytes into shared memory instead of
+pickling objects through a pipe. A RingBuffer holds up to capacity records
+of record_size bytes, first in first out, for any number of producing and
+consuming processes. Two semaphores count the free and the filled slots and
+a lock guards the head and tail counters at the start of the block.
+
+A RingBuffer reaches a child process as a Process (or Pool initializer)
+argument, the same way as the multiprocessing primitives it is built on.
+"""
+import multiprocessing
+import os
+import queue
+import struct
+from multiprocessing import shared_memory
+
+# Records got and put so far
+HEADER = struct.Struct('<QQ')
+
+
+class RingBuffer:
+    def __init__(self, record_size, capacity=64):
+        context = multiprocessing.get_context()
+        self.record_size = record_size
+        self.capacity = capacity
+        self.shared_memory = shared_memory.SharedMemory(create=True,
+                                                        size=HEADER.size + record_size * capacity)
+        HEADER.pack_into(self.shared_memory.buf, 0, 0, 0)
+        self.lock = context.Lock()
+        self.free_slots = context.Semaphore(capacity)
+        self.filled_slots = context.Semaphore(0)
+        # Forked children inherit the object as it is, so the creator is told apart by pid
+        self.owner_pid = os.getpid()
+
+    def __getstate__(self):
+        return (self.shared_memory.name, self.record_size, self.capacity, self.lock,
+                self.free_slots, self.filled_slots, self.owner_pid)
+
+    def __setstate__(self, state):
+        (name, self.record_size, self.capacity, self.lock, self.free_slots, self.filled_slots,
+         self.owner_pid) = state
+        self.shared_memory = shared_memory.SharedMemory(name=name)
+
+    def put(self, record, timeout=None):
+        """Copy record (at most record_size bytes) into the next slot, waiting
+        up to timeout seconds for one to be free; raises queue.Full"""
+        if len(record) > self.record_size:
+            raise ValueError(f"Record of {len(record)} bytes in a ring of {self.record_size} byte records")
+        if not self.free_slots.acquire(True, timeout):
+            raise queue.Full
+        buf = self.shared_memory.buf
+        with self.lock:
+            head, tail = HEADER.unpack_from(buf, 0)
+            offset = HEADER.size + (tail % self.capacity) * self.record_size
+            buf[offset:offset + len(record)] = record
+            HEADER.pack_into(buf, 0, head, tail + 1)
+        self.filled_slots.release()
+
+    def get(self, timeout=None):
+        """The oldest record (record_size bytes), waiting up to timeout
+        seconds for one; raises queue.Empty"""
+        if not self.filled_slots.acquire(True, timeout):
+            raise queue.Empty
+        buf = self.shared_memory.buf
+        with self.lock:
+            head, tail = HEADER.unpack_from(buf, 0)
+            offset = HEADER.size + (head % self.capacity) * self.record_size
+            record = bytes(buf[offset:offset + self.record_size])
+            HEADER.pack_into(buf, 0, head + 1, tail)
+        self.free_slots.release()
+        return record
+
+    def close(self):
+        """Detach from the block; the creating process also frees it"""
+        self.shared_memory.close()
+        if os.getpid() == self.owner_pid:
+            self.shared_memory.unlink()
@@ -2,6 +2,7 @@ import pygame
 import os
 from move_validator import MoveValidator 
 from bot import ChessBot
+from moves import move_to_tuple, promotion_piece
 
 # Initialize pygame
 pygame.init()
@@ -73,6 +74,8 @@ selected_piece = None
 selected_pos = None
 turn = True  # True for white, False for black
 bot = ChessBot(move_validator)
+bot_search = None  # BackgroundMove of the bot while it is thinking
+ponder_search = None  # BackgroundMove of the bot pondering on the human's time
 game_over = False
 winner = None
 
@@ -264,9 +267,41 @@ def draw_promotion_menu(pawn_color):
         if piece_key in pieces:
             win.blit(pieces[piece_key], (menu_x, menu_y + i * SQUARE_SIZE))
 
+def play_bot_move(move):
+    """Play the move the bot chose through the same path as a human move,
+    then let the bot ponder on the human's reply"""
+    global turn, ponder_search
+    start_pos, end_pos = move_to_tuple(move)
+    move_piece(start_pos, end_pos)
+    if promoting_pawn:
+        handle_promotion(promotion_piece(move) or 'Q')
+    else:
+        turn = not turn
+    ponder_search = bot.start_ponder(initial_board, turn, castling_rights, last_move)
+
+def start_bot_search():
+    """Start (or take over from pondering) the search for the bot's move;
+    waits for the next frame while a missed ponder search winds down"""
+    global bot_search, ponder_search
+    if ponder_search is not None:
+        if ponder_search.matches(initial_board, turn):
+            # The human played the predicted move: keep searching, now on the clock
+            ponder_search.ponderhit()
+            bot_search, ponder_search = ponder_search, None
+        else:
+            # Only one search may run on the bot at a time
+            ponder_search.stop()
+            if not ponder_search.done():
+                return
+            ponder_search = None
+    if bot_search is None:
+        bot_search = bot.start_move(initial_board, turn, castling_rights, last_move)
+    pygame.display.set_caption("Chess Board - Bot thinking (Space: move now)")
+
 # Main function
 def main():
-    global selected_piece, selected_pos, turn, valid_moves, promoting_pawn, initial_board, game_over, winner
+    global selected_piece, selected_pos, turn, valid_moves, promoting_pawn, initial_board, game_over, winner, bot_search
+    global ponder_search
     
     running = True
     clock = pygame.time.Clock()
@@ -282,6 +317,8 @@ def main():
             winner = None
 
         if game_over:
+            if ponder_search:
+                ponder_search.stop()
             draw_board()  # Vẽ bàn cờ trước
             display_game_result(winner)  # Hiển thị thông báo kết quả
             pygame.display.flip()
@@ -293,26 +330,35 @@ def main():
             continue
 
         # Bot đi nếu đến lượt đen và không đang phong cấp
+        # The search runs on a background thread; the frame loop keeps going
+        # and plays its move on the first frame after it is done
         if not turn and not promoting_pawn and not game_over:
-            result = bot.make_move(initial_board, turn, castling_rights, last_move)
-            if isinstance(result, tuple):
-                promoting_pawn = result
-            else:
-                turn = not turn
-            
-            # Cập nhật trạng thái cho move validator
-            move_validator.board = initial_board
-            move_validator.last_move = last_move
-            
-            # Hiển thị nước đi của bot
-            draw_board()
-            pygame.display.flip()
-            pygame.time.delay(500)  # Dừng ngắn để xem nước đi
+            if bot_search is None:
+                start_bot_search()
+            elif bot_search.done():
+                move = bot_search.move
+                bot_search = None
+                pygame.display.set_caption("Chess Board")
+                if move is not None:
+                    play_bot_move(move)
 
         # Xử lý sự kiện người chơi
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+                if bot_search:
+                    bot_search.stop()
+                if ponder_search:
+                    ponder_search.stop()
+
+            # Space makes the bot play its best move so far
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE and bot_search:
+                bot_search.stop()
+
+            # The board belongs to the bot on its turn, including the frames in
+            # which a missed ponder search winds down before its search starts
+            if not turn:
+                continue
             
             if event.type == pygame.MOUSEBUTTONDOWN and not game_over:
                 mouse_pos = pygame.mouse.get_pos()
@@ -355,6 +401,13 @@ def main():
         pygame.display.flip()
         clock.tick(30)
 
+    # A search still running has to end before the bot's worker processes
+    # and shared table go
+    for search in (bot_search, ponder_search):
+        if search:
+            search.stop()
+            search.thread.join()
+    bot.close()
     pygame.quit()
 
 if __name__ == "__main__":
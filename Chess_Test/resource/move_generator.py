@@ -1,167 +1,359 @@
+from attacks import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, LINE,
+                     ROOK_PSEUDO_ATTACKS, BISHOP_PSEUDO_ATTACKS,
+                     rook_attacks, bishop_attacks, queen_attacks)
+from moves import (CAPTURE, DOUBLE_PUSH, EP_CAPTURE, KING_CASTLE, QUEEN_CASTLE, PROMOTION,
+                   PROMOTION_PIECES)
+from position import (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                      iter_squares, lsb)
+
+ALL_SQUARES = (1 << 64) - 1
+
+# Move kinds for staged generation
+CAPTURES = 1
+QUIETS = 2
+ALL_MOVES = CAPTURES | QUIETS
+
+CAPTURE_BITS = CAPTURE << 12
+DOUBLE_PUSH_BITS = DOUBLE_PUSH << 12
+EP_CAPTURE_BITS = EP_CAPTURE << 12
+# Queen first so the most useful promotion is generated first
+PROMOTION_FLAGS = tuple((PROMOTION + index) << 12 for index in (3, 0, 2, 1))
+PROMOTION_CAPTURE_FLAGS = tuple(flags | CAPTURE_BITS for flags in PROMOTION_FLAGS)
+SQUARE_COORDS = tuple((sq & 7, sq >> 3) for sq in range(64))
+
+# (right, king from, king to, squares that must be empty, squares the king crosses, rook square)
+CASTLING_MOVES = {
+    'w': ((WHITE_KINGSIDE, 60, 62, (1 << 61) | (1 << 62), (61, 62), 63),
+          (WHITE_QUEENSIDE, 60, 58, (1 << 57) | (1 << 58) | (1 << 59), (59, 58), 56)),
+    'b': ((BLACK_KINGSIDE, 4, 6, (1 << 5) | (1 << 6), (5, 6), 7),
+          (BLACK_QUEENSIDE, 4, 2, (1 << 1) | (1 << 2) | (1 << 3), (3, 2), 0)),
+}
+
+
 class MoveGenerator:
-    def __init__(self, board):
-        self.board = board
-        self.is_white_turn = True  # Default value, updated by ChessBot
-        self.castling_rights = ''
-        self.last_move = None
-        # Initialize any move generation data (e.g., bitboards or lookup tables)
-        self.move_data = {}  # Placeholder for move generation data
-
-    def init_move_generation(self):
-        """Initialize move generation state."""
-        # Use self.is_white_turn instead of self.board.is_white_turn
-        self.is_white_to_move = self.is_white_turn
-        # Additional initialization (e.g., update bitboards or move tables)
-        # For now, we assume this is minimal since we're using a 2D list
-        self.move_data.clear()  # Reset any cached move data
-
-    def generate_moves(self):
-        """Generate all valid moves for the current player."""
-        self.init_move_generation()
-        moves = []
-        color = 'w' if self.is_white_to_move else 'b'
-        
-        # Iterate over the 8x8 board
-        for rank in range(8):
-            for file in range(8):
-                piece = self.board[rank][file]
-                if piece and piece[0] == color:
-                    piece_moves = self.get_piece_moves(file, rank, piece)
-                    for move in piece_moves:
-                        start_square = rank * 8 + file
-                        end_square = move[1] * 8 + move[0]
-                        moves.append((start_square, end_square))
-        
-        return moves
+    """Legal move generator working on a Position.
 
-    def get_piece_moves(self, file, rank, piece):
-        """Generate moves for a specific piece at (file, rank)."""
-        moves = []
-        piece_type = piece[1]
-        color = piece[0]
-        
-        if piece_type == 'P':  # Pawn
-            moves.extend(self.get_pawn_moves(file, rank, color))
-        elif piece_type == 'N':  # Knight
-            moves.extend(self.get_knight_moves(file, rank))
-        elif piece_type == 'B':  # Bishop
-            moves.extend(self.get_bishop_moves(file, rank))
-        elif piece_type == 'R':  # Rook
-            moves.extend(self.get_rook_moves(file, rank))
-        elif piece_type == 'Q':  # Queen
-            moves.extend(self.get_queen_moves(file, rank))
-        elif piece_type == 'K':  # King
-            moves.extend(self.get_king_moves(file, rank))
-        
-        return moves
+    Checkers, pinned pieces and the check-block mask are computed once per
+    position in init_move_generation(), so every emitted move is legal without
+    playing it out on a trial board.
+    """
 
-    def get_pawn_moves(self, file, rank, color):
-        moves = []
-        direction = -1 if color == 'w' else 1
-        start_rank = 6 if color == 'w' else 1
-        
-        # Move one square forward
-        new_rank = rank + direction
-        if 0 <= new_rank < 8 and self.board[new_rank][file] == '':
-            moves.append((file, new_rank))
-            
-            # Move two squares from starting rank
-            if rank == start_rank:
-                new_rank2 = rank + 2 * direction
-                if self.board[new_rank2][file] == '' and self.board[new_rank][file] == '':
-                    moves.append((file, new_rank2))
-        
-        # Capture diagonally
-        for df in [-1, 1]:
-            new_file = file + df
-            if 0 <= new_file < 8 and 0 <= new_rank < 8:
-                target = self.board[new_rank][new_file]
-                if target and target[0] != color:
-                    moves.append((new_file, new_rank))
-        
-        # En passant
-        if self.last_move and len(self.last_move) == 2:
-            (start_file, start_rank), (end_file, end_rank) = self.last_move
-            if abs(start_rank - end_rank) == 2 and self.board[end_rank][end_file][1] == 'P':
-                ep_rank = rank
-                ep_file = end_file
-                if abs(file - ep_file) == 1 and (rank == 3 and color == 'w' or rank == 4 and color == 'b'):
-                    moves.append((ep_file, rank + direction))
-        
-        return moves
+    def __init__(self, position):
+        self.position = position
 
-    def get_knight_moves(self, file, rank):
-        moves = []
-        knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-        for df, dr in knight_moves:
-            new_file, new_rank = file + df, rank + dr
-            if 0 <= new_file < 8 and 0 <= new_rank < 8:
-                target = self.board[new_rank][new_file]
-                if not target or target[0] != self.board[rank][file][0]:
-                    moves.append((new_file, new_rank))
-        return moves
+    def init_move_generation(self, color=None):
+        """Compute the king square, checkers, pins and check mask for color (default: side to move)."""
+        pos = self.position
+        bb = pos.bitboards
+        us = color or pos.side_to_move
+        them = 'b' if us == 'w' else 'w'
+        self.us = us
+        self.them = them
+        self.own = pos.occupancy[us]
+        self.enemy = pos.occupancy[them]
+        self.king_sq = king_sq = pos.king_squares[us]
+        self.checkers = pos.attackers_to(king_sq, them)
+
+        # Enemy sliders lined up with our king with exactly one of our pieces between
+        self.pinned = 0
+        occupied = pos.occupied
+        snipers = ((ROOK_PSEUDO_ATTACKS[king_sq] & (bb[them + 'R'] | bb[them + 'Q']))
+                   | (BISHOP_PSEUDO_ATTACKS[king_sq] & (bb[them + 'B'] | bb[them + 'Q'])))
+        for sniper in iter_squares(snipers):
+            blockers = BETWEEN[king_sq][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & self.own:
+                self.pinned |= blockers
 
-    def get_bishop_moves(self, file, rank):
+        # Non-king moves must land on these squares: anywhere when not in check,
+        # on the checker or the squares between it and the king in single check,
+        # nowhere in double check
+        if not self.checkers:
+            self.check_mask = ALL_SQUARES
+        elif self.checkers & (self.checkers - 1):
+            self.check_mask = 0
+        else:
+            checker = lsb(self.checkers)
+            self.check_mask = self.checkers | BETWEEN[king_sq][checker]
+        self.targets = ~self.own & self.check_mask
+        # Filled on the first gives_check() call
+        self.check_squares = None
+
+    def generate_moves(self, color=None, kind=ALL_MOVES):
+        """Generate legal moves for color (default: side to move) as encoded moves.
+
+        kind selects CAPTURES (captures, en passant and all promotions),
+        QUIETS (everything else) or ALL_MOVES.
+        """
+        self.init_move_generation(color)
+        return self.generate_stage(kind)
+
+    def generate_stage(self, kind):
+        """Generate one kind of legal move (requires init_move_generation)."""
+        if self.checkers:
+            return self.generate_evasions(kind)
+        bb = self.position.bitboards
+        us = self.us
         moves = []
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for df, dr in directions:
-            for i in range(1, 8):
-                new_file, new_rank = file + i * df, rank + i * dr
-                if not (0 <= new_file < 8 and 0 <= new_rank < 8):
-                    break
-                target = self.board[new_rank][new_file]
-                if not target:
-                    moves.append((new_file, new_rank))
-                elif target[0] != self.board[rank][file][0]:
-                    moves.append((new_file, new_rank))
-                    break
-                else:
-                    break
+
+        if self.check_mask:
+            for sq in iter_squares(bb[us + 'P']):
+                self.add_pawn_moves(sq, moves, kind)
+            for piece_type in ('N', 'B', 'R', 'Q'):
+                for sq in iter_squares(bb[us + piece_type]):
+                    self.add_piece_moves(sq, piece_type, moves, kind)
+        self.add_king_moves(self.king_sq, moves, kind)
         return moves
 
-    def get_rook_moves(self, file, rank):
+    def generate_evasions(self, kind=ALL_MOVES):
+        """Legal moves out of check: king moves, captures of the checker and interpositions.
+
+        Instead of walking every piece, the candidates are looked up from the
+        target squares: pieces attacking the checker, pieces attacking a
+        square between it and the king, and pawns that can push onto one.
+        """
+        pos = self.position
+        bb = pos.bitboards
+        us = self.us
         moves = []
-        directions = [(0, -1), (0, 1), (-1, 0), (1, 0)]
-        for df, dr in directions:
-            for i in range(1, 8):
-                new_file, new_rank = file + i * df, rank + i * dr
-                if not (0 <= new_file < 8 and 0 <= new_rank < 8):
-                    break
-                target = self.board[new_rank][new_file]
-                if not target:
-                    moves.append((new_file, new_rank))
-                elif target[0] != self.board[rank][file][0]:
-                    moves.append((new_file, new_rank))
-                    break
+        self.add_king_moves(self.king_sq, moves, kind)
+        if not self.check_mask:
+            return moves  # Double check: only the king can move
+
+        checker = lsb(self.checkers)
+        pawns = bb[us + 'P']
+        # Pinned pieces can never resolve a check, and the king was handled above
+        movable = ~(self.pinned | (1 << self.king_sq))
+        step = -8 if us == 'w' else 8
+        start_rank = 6 if us == 'w' else 1
+        promotion_rank = 1 if us == 'w' else 6
+
+        if kind & CAPTURES:
+            for sq in iter_squares(pos.attackers_to(checker, us) & movable):
+                if pawns & (1 << sq) and sq >> 3 == promotion_rank:
+                    for flags in PROMOTION_CAPTURE_FLAGS:
+                        moves.append(sq | (checker << 6) | flags)
                 else:
-                    break
+                    moves.append(sq | (checker << 6) | CAPTURE_BITS)
+            ep = pos.ep_square
+            if ep is not None and us == pos.side_to_move:
+                for sq in iter_squares(PAWN_ATTACKS[self.them][ep] & pawns):
+                    if self.is_legal_en_passant(sq, ep, ep - step):
+                        moves.append(sq | (ep << 6) | EP_CAPTURE_BITS)
+
+        for to_sq in iter_squares(BETWEEN[self.king_sq][checker]):
+            if kind & QUIETS:
+                blockers = pos.attackers_to(to_sq, us) & movable & ~pawns
+                for sq in iter_squares(blockers):
+                    moves.append(sq | (to_sq << 6))
+            one = to_sq - step
+            if not 0 <= one < 64:
+                continue
+            if pawns & movable & (1 << one):
+                if one >> 3 == promotion_rank:
+                    if kind & CAPTURES:
+                        for flags in PROMOTION_FLAGS:
+                            moves.append(one | (to_sq << 6) | flags)
+                elif kind & QUIETS:
+                    moves.append(one | (to_sq << 6))
+            elif kind & QUIETS and not pos.occupied & (1 << one):
+                two = one - step
+                if two >> 3 == start_rank and pawns & movable & (1 << two):
+                    moves.append(two | (to_sq << 6) | DOUBLE_PUSH_BITS)
         return moves
 
-    def get_queen_moves(self, file, rank):
+    def get_piece_moves(self, sq, piece_type):
+        """Legal moves of the piece on sq (requires init_move_generation)."""
         moves = []
-        moves.extend(self.get_bishop_moves(file, rank))
-        moves.extend(self.get_rook_moves(file, rank))
+        if piece_type == 'K':
+            self.add_king_moves(sq, moves)
+        elif not self.check_mask:
+            pass  # Double check: only the king can move
+        elif piece_type == 'P':
+            self.add_pawn_moves(sq, moves)
+        else:
+            self.add_piece_moves(sq, piece_type, moves)
         return moves
 
-    def get_king_moves(self, file, rank):
-        moves = []
-        king_moves = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        for df, dr in king_moves:
-            new_file, new_rank = file + df, rank + dr
-            if 0 <= new_file < 8 and 0 <= new_rank < 8:
-                target = self.board[new_rank][new_file]
-                if not target or target[0] != self.board[rank][file][0]:
-                    moves.append((new_file, new_rank))
-        
+    def is_legal(self, move):
+        """Whether an encoded move (e.g. a hash or killer move) is legal here (requires init_move_generation)."""
+        from_sq = move & 63
+        piece = self.position.piece_at(from_sq)
+        if not piece or piece[0] != self.us:
+            return False
+        return move in self.get_piece_moves(from_sq, piece[1])
+
+    def add_piece_moves(self, sq, piece_type, moves, kind=ALL_MOVES):
+        occupied = self.position.occupied
+        if piece_type == 'N':
+            # A pinned knight can never move
+            if self.pinned & (1 << sq):
+                return
+            attacks = KNIGHT_ATTACKS[sq]
+        elif piece_type == 'B':
+            attacks = bishop_attacks(sq, occupied)
+        elif piece_type == 'R':
+            attacks = rook_attacks(sq, occupied)
+        else:
+            attacks = queen_attacks(sq, occupied)
+        attacks &= self.targets
+        if self.pinned & (1 << sq):
+            attacks &= LINE[self.king_sq][sq]
+        if kind & CAPTURES:
+            for to_sq in iter_squares(attacks & self.enemy):
+                moves.append(sq | (to_sq << 6) | CAPTURE_BITS)
+        if kind & QUIETS:
+            for to_sq in iter_squares(attacks & ~occupied):
+                moves.append(sq | (to_sq << 6))
+
+    def add_pawn_moves(self, sq, moves, kind=ALL_MOVES):
+        pos = self.position
+        us = self.us
+        occupied = pos.occupied
+        step = -8 if us == 'w' else 8
+        start_rank = 6 if us == 'w' else 1
+        promotion_rank = 1 if us == 'w' else 6
+        allowed = self.check_mask
+        if self.pinned & (1 << sq):
+            allowed &= LINE[self.king_sq][sq]
+
+        one = sq + step
+        if sq >> 3 == promotion_rank:
+            # Every promotion counts as a capture-stage move
+            if kind & CAPTURES:
+                for to_sq in iter_squares(PAWN_ATTACKS[us][sq] & self.enemy & allowed):
+                    for flags in PROMOTION_CAPTURE_FLAGS:
+                        moves.append(sq | (to_sq << 6) | flags)
+                if not occupied & (1 << one) and allowed & (1 << one):
+                    for flags in PROMOTION_FLAGS:
+                        moves.append(sq | (one << 6) | flags)
+            return
+
+        if kind & CAPTURES:
+            for to_sq in iter_squares(PAWN_ATTACKS[us][sq] & self.enemy & allowed):
+                moves.append(sq | (to_sq << 6) | CAPTURE_BITS)
+            # En passant, verified against the position after the capture so
+            # discovered checks along the rank (and pins) are caught
+            ep = pos.ep_square
+            if ep is not None and us == pos.side_to_move and PAWN_ATTACKS[us][sq] & (1 << ep):
+                if self.is_legal_en_passant(sq, ep, ep - step):
+                    moves.append(sq | (ep << 6) | EP_CAPTURE_BITS)
+
+        if kind & QUIETS and not occupied & (1 << one):
+            if allowed & (1 << one):
+                moves.append(sq | (one << 6))
+            two = one + step
+            if sq >> 3 == start_rank and not occupied & (1 << two) and allowed & (1 << two):
+                moves.append(sq | (two << 6) | DOUBLE_PUSH_BITS)
+
+    def is_legal_en_passant(self, from_sq, ep_sq, captured_sq):
+        pos = self.position
+        bb = pos.bitboards
+        them = self.them
+        occupied = (pos.occupied ^ (1 << from_sq) ^ (1 << captured_sq)) | (1 << ep_sq)
+        king_sq = self.king_sq
+        if rook_attacks(king_sq, occupied) & (bb[them + 'R'] | bb[them + 'Q']):
+            return False
+        if bishop_attacks(king_sq, occupied) & (bb[them + 'B'] | bb[them + 'Q']):
+            return False
+        # Any remaining checker must be the captured pawn itself
+        return not self.checkers & ~(1 << captured_sq)
+
+    def add_king_moves(self, sq, moves, kind=ALL_MOVES):
+        pos = self.position
+        them = self.them
+        # Take the king off the board so sliders see through its current square
+        occupied = pos.occupied ^ (1 << sq)
+        destinations = KING_ATTACKS[sq] & ~self.own
+        if not kind & CAPTURES:
+            destinations &= ~self.enemy
+        if not kind & QUIETS:
+            destinations &= self.enemy
+        for to_sq in iter_squares(destinations):
+            if not pos.attackers_to(to_sq, them, occupied):
+                if self.enemy & (1 << to_sq):
+                    moves.append(sq | (to_sq << 6) | CAPTURE_BITS)
+                else:
+                    moves.append(sq | (to_sq << 6))
+
         # Castling
-        if self.board[rank][file][1] == 'K':
-            if self.is_white_to_move and 'K' in self.castling_rights and self.board[7][5] == '' and self.board[7][6] == '':
-                moves.append((6, 7))  # Kingside castling (white)
-            if self.is_white_to_move and 'Q' in self.castling_rights and self.board[7][3] == '' and self.board[7][2] == '' and self.board[7][1] == '':
-                moves.append((2, 7))  # Queenside castling (white)
-            if not self.is_white_to_move and 'k' in self.castling_rights and self.board[0][5] == '' and self.board[0][6] == '':
-                moves.append((6, 0))  # Kingside castling (black)
-            if not self.is_white_to_move and 'q' in self.castling_rights and self.board[0][3] == '' and self.board[0][2] == '' and self.board[0][1] == '':
-                moves.append((2, 0))  # Queenside castling (black)
-        
-        return moves
\ No newline at end of file
+        if kind & QUIETS and not self.checkers and pos.castling:
+            rook = self.us + 'R'
+            for right, king_from, king_to, empty, path, rook_sq in CASTLING_MOVES[self.us]:
+                if (pos.castling & right and sq == king_from and not pos.occupied & empty
+                        and pos.piece_at(rook_sq) == rook
+                        and not any(pos.is_square_attacked(path_sq, them) for path_sq in path)):
+                    flags = KING_CASTLE if king_to > king_from else QUEEN_CASTLE
+                    moves.append(sq | (king_to << 6) | (flags << 12))
+
+    def init_check_info(self):
+        """Squares from which each of our piece types would check the enemy king,
+        and our pieces whose move would uncover a check from one of our sliders."""
+        pos = self.position
+        bb = pos.bitboards
+        us = self.us
+        occupied = pos.occupied
+        king_sq = self.enemy_king_sq = pos.king_squares[self.them]
+        bishop_squares = bishop_attacks(king_sq, occupied)
+        rook_squares = rook_attacks(king_sq, occupied)
+        self.check_squares = {
+            'P': PAWN_ATTACKS[self.them][king_sq],
+            'N': KNIGHT_ATTACKS[king_sq],
+            'B': bishop_squares,
+            'R': rook_squares,
+            'Q': bishop_squares | rook_squares,
+            'K': 0,
+        }
+        self.discoverers = 0
+        snipers = ((ROOK_PSEUDO_ATTACKS[king_sq] & (bb[us + 'R'] | bb[us + 'Q']))
+                   | (BISHOP_PSEUDO_ATTACKS[king_sq] & (bb[us + 'B'] | bb[us + 'Q'])))
+        for sniper in iter_squares(snipers):
+            blockers = BETWEEN[king_sq][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & self.own:
+                self.discoverers |= blockers
+
+    def gives_check(self, move):
+        """Whether a legal move checks the enemy king, without playing it (requires init_move_generation)."""
+        if self.check_squares is None:
+            self.init_check_info()
+        pos = self.position
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flags = move >> 12
+        king_sq = self.enemy_king_sq
+        piece_type = pos.board[from_sq >> 3][from_sq & 7][1]
+
+        # Direct check
+        if flags & PROMOTION:
+            piece_type = PROMOTION_PIECES[flags & 3]
+            occupied = pos.occupied ^ (1 << from_sq)
+            if piece_type == 'N':
+                attacks = KNIGHT_ATTACKS[to_sq]
+            elif piece_type == 'B':
+                attacks = bishop_attacks(to_sq, occupied)
+            elif piece_type == 'R':
+                attacks = rook_attacks(to_sq, occupied)
+            else:
+                attacks = queen_attacks(to_sq, occupied)
+            if attacks & (1 << king_sq):
+                return True
+        elif self.check_squares[piece_type] & (1 << to_sq):
+            return True
+
+        # Discovered check: a blocker leaving the line between our slider and the king
+        if self.discoverers & (1 << from_sq) and not LINE[king_sq][from_sq] & (1 << to_sq):
+            return True
+
+        bb = pos.bitboards
+        us = self.us
+        if flags == EP_CAPTURE:
+            # The captured pawn may uncover a line as well
+            captured_sq = (from_sq & ~7) | (to_sq & 7)
+            occupied = pos.occupied ^ (1 << from_sq) ^ (1 << captured_sq) | (1 << to_sq)
+            return bool((rook_attacks(king_sq, occupied) & (bb[us + 'R'] | bb[us + 'Q']))
+                        | (bishop_attacks(king_sq, occupied) & (bb[us + 'B'] | bb[us + 'Q'])))
+        if flags in (KING_CASTLE, QUEEN_CASTLE):
+            rook_from = to_sq + 1 if flags == KING_CASTLE else to_sq - 2
+            rook_to = (from_sq + to_sq) // 2
+            occupied = pos.occupied ^ (1 << from_sq) ^ (1 << rook_from) | (1 << to_sq) | (1 << rook_to)
+            return bool(rook_attacks(rook_to, occupied) & (1 << king_sq))
+        return False
@@ -0,0 +1,92 @@
+from move_generator import MoveGenerator, CAPTURES, QUIETS
+from moves import NULL_MOVE
+from ordering import capture_score
+from see import see_ge
+
+# Hash move, winning and even captures, killers and countermove, quiet moves, losing captures
+HASH_STAGE, CAPTURE_STAGE, KILLER_STAGE, QUIET_STAGE, BAD_CAPTURE_STAGE = range(5)
+
+
+class MovePicker:
+    """Yields the legal moves of a position one stage at a time.
+
+    The hash move comes first, then captures and promotions that do not lose
+    material by SEE ordered by MVV-LVA, then the killer moves of the ply and
+    the countermove to the previous move, then the remaining quiet moves
+    (checks first, then by history), then the losing captures. In check the
+    generator only produces evasions. The tables come from a MoveOrdering.
+
+    A stage is only generated once the previous one is exhausted, so a beta
+    cutoff on an early move skips the rest of the generation. A picker that
+    yields nothing means checkmate or stalemate. With captures_only the picker
+    ends after the good captures (quiescence), except in check where every
+    evasion is still produced.
+    """
+
+    def __init__(self, position, hash_move=NULL_MOVE, ordering=None, ply=0, captures_only=False):
+        self.position = position
+        self.captures_only = captures_only
+        self.hash_move = hash_move
+        self.ordering = ordering
+        self.ply = ply
+        self.stage = HASH_STAGE
+        self.generator = MoveGenerator(position)
+        self.generator.init_move_generation()
+
+    def __iter__(self):
+        generator = self.generator
+        position = self.position
+        ordering = self.ordering
+        hash_move = self.hash_move
+
+        self.stage = HASH_STAGE
+        if hash_move and generator.is_legal(hash_move):
+            yield hash_move
+        else:
+            hash_move = NULL_MOVE
+
+        self.stage = CAPTURE_STAGE
+        board = position.board
+        captures = generator.generate_stage(CAPTURES)
+        captures.sort(key=lambda move: capture_score(board, move), reverse=True)
+        bad_captures = []
+        for move in captures:
+            if move == hash_move:
+                continue
+            if see_ge(position, move, 0):
+                yield move
+            else:
+                bad_captures.append(move)
+
+        # Quiescence stops here unless the side to move has to get out of check
+        if self.captures_only and not generator.checkers:
+            return
+
+        self.stage = KILLER_STAGE
+        refutations = []
+        if ordering is not None:
+            candidates = list(ordering.killers_at(self.ply))
+            if position.undo_stack:
+                candidates.append(ordering.countermove(position.undo_stack[-1][0]))
+            for move in candidates:
+                # Killers and countermoves come from other nodes and may not be legal here
+                if (move and move != hash_move and move not in refutations
+                        and not move & 0xC000 and generator.is_legal(move)):
+                    refutations.append(move)
+                    yield move
+
+        self.stage = QUIET_STAGE
+        quiets = generator.generate_stage(QUIETS)
+        gives_check = generator.gives_check
+        # Checking moves first, then by history
+        if ordering is not None:
+            history = ordering.history
+            quiets.sort(key=lambda move: (gives_check(move), history[move & 0xFFF]), reverse=True)
+        else:
+            quiets.sort(key=gives_check, reverse=True)
+        for move in quiets:
+            if move != hash_move and move not in refutations:
+                yield move
+
+        self.stage = BAD_CAPTURE_STAGE
+        yield from bad_captures
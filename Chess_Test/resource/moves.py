@@ -0,0 +1,87 @@
+"""16-bit move encoding.
+
+bits 0-5   from square
+bits 6-11  to square
+bits 12-15 flags: quiet, double push, castles, capture, en passant and the
+           four promotion pieces (with or without capture)
+
+Squares follow position.py (a8 = 0, h1 = 63).
+"""
+
+SQUARE_NAMES = tuple(chr(ord('a') + (sq & 7)) + str(8 - (sq >> 3)) for sq in range(64))
+
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EP_CAPTURE = 5
+PROMOTION = 8  # + index into PROMOTION_PIECES, | CAPTURE for promotion captures
+
+PROMOTION_PIECES = ('N', 'B', 'R', 'Q')
+NULL_MOVE = 0
+
+
+def encode_move(from_sq, to_sq, flags=QUIET):
+    return from_sq | (to_sq << 6) | (flags << 12)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_flags(move):
+    return move >> 12
+
+
+def is_capture(move):
+    return bool(move & 0x4000)
+
+
+def is_promotion(move):
+    return bool(move & 0x8000)
+
+
+def is_castle(move):
+    return (move >> 12) in (KING_CASTLE, QUEEN_CASTLE)
+
+
+def promotion_piece(move):
+    """Promotion piece type ('N', 'B', 'R', 'Q') or None"""
+    if move & 0x8000:
+        return PROMOTION_PIECES[(move >> 12) & 3]
+    return None
+
+
+def move_to_tuple(move):
+    """((file, rank), (file, rank)) form used by the GUI"""
+    from_sq, to_sq = move & 63, (move >> 6) & 63
+    return (from_sq & 7, from_sq >> 3), (to_sq & 7, to_sq >> 3)
+
+
+def move_to_uci(move):
+    promotion = promotion_piece(move)
+    uci = SQUARE_NAMES[move & 63] + SQUARE_NAMES[(move >> 6) & 63]
+    return uci + promotion.lower() if promotion else uci
+
+
+def find_move(moves, from_sq, to_sq, promotion='Q'):
+    """Pick the move matching from/to (and the promotion piece) out of a move list"""
+    for move in moves:
+        if move & 0xFFF == from_sq | (to_sq << 6):
+            if not move & 0x8000 or PROMOTION_PIECES[(move >> 12) & 3] == promotion:
+                return move
+    return None
+
+
+def move_from_tuple(moves, start, end, promotion='Q'):
+    return find_move(moves, start[1] * 8 + start[0], end[1] * 8 + end[0], promotion)
+
+
+def move_from_uci(moves, uci):
+    promotion = uci[4].upper() if len(uci) > 4 else 'Q'
+    return find_move(moves, SQUARE_NAMES.index(uci[:2]), SQUARE_NAMES.index(uci[2:4]), promotion)
@@ -0,0 +1,79 @@
+"""Move ordering tables.
+
+Everything here is a table lookup: MVV-LVA for captures, two killer slots
+per ply, a from-to history array and a countermove table indexed by the
+from-to bits of the previous move. Scoring a move never looks at attacks or
+copies the board.
+"""
+from evaluation import PIECE_VALUES
+from moves import NULL_MOVE, EP_CAPTURE, PROMOTION_PIECES
+
+PIECE_ORDER = ('P', 'N', 'B', 'R', 'Q', 'K')
+# MVV_LVA[victim][attacker]: most valuable victim first, least valuable attacker breaking ties
+MVV_LVA = {
+    victim: {attacker: 10 * PIECE_VALUES[victim] - PIECE_VALUES[attacker] for attacker in PIECE_ORDER}
+    for victim in PIECE_ORDER
+}
+PROMOTION_BONUS = {piece: PIECE_VALUES[piece] for piece in PROMOTION_PIECES}
+
+# History scores are halved once any entry passes this, and between searches
+HISTORY_MAX = 1 << 20
+
+
+def capture_score(board, move):
+    """MVV-LVA score of a capture or promotion"""
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    attacker = board[from_sq >> 3][from_sq & 7][1]
+    victim = board[to_sq >> 3][to_sq & 7]
+    if move >> 12 == EP_CAPTURE:
+        score = MVV_LVA['P'][attacker]  # The victim is not on the target square
+    elif victim:
+        score = MVV_LVA[victim[1]][attacker]
+    else:
+        score = -PIECE_VALUES[attacker]  # Quiet promotion
+    if move & 0x8000:
+        score += PROMOTION_BONUS[PROMOTION_PIECES[(move >> 12) & 3]]
+    return score
+
+
+class MoveOrdering:
+    def __init__(self, max_ply=64):
+        self.max_ply = max_ply
+        self.killers = [[NULL_MOVE, NULL_MOVE] for _ in range(max_ply)]
+        self.history = [0] * 4096
+        self.countermoves = [NULL_MOVE] * 4096
+
+    def new_search(self):
+        """Forget the killers and age the history so older searches weigh less"""
+        for killers in self.killers:
+            killers[0] = killers[1] = NULL_MOVE
+        self.history = [score >> 1 for score in self.history]
+
+    def killers_at(self, ply):
+        return self.killers[ply] if ply < self.max_ply else ()
+
+    def countermove(self, previous_move):
+        return self.countermoves[previous_move & 0xFFF] if previous_move else NULL_MOVE
+
+    def history_score(self, move):
+        return self.history[move & 0xFFF]
+
+    def update_quiet_cutoff(self, move, ply, depth, previous_move=NULL_MOVE, tried_quiets=()):
+        """Reward a quiet move that caused a beta cutoff and penalise the quiet
+        moves searched before it without one"""
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+        if previous_move:
+            self.countermoves[previous_move & 0xFFF] = move
+
+        history = self.history
+        bonus = depth * depth
+        history[move & 0xFFF] += bonus
+        for tried in tried_quiets:
+            history[tried & 0xFFF] -= bonus
+        if history[move & 0xFFF] >= HISTORY_MAX:
+            self.history = [score >> 1 for score in history]
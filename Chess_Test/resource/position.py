@@ -0,0 +1,444 @@
+import struct
+
+from attacks import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+                     ROOK_TABLES, ROOK_MASKS, BISHOP_TABLES, BISHOP_MASKS)
+from moves import (DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, EP_CAPTURE, PROMOTION, PROMOTION_PIECES,
+                   NULL_MOVE)
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_FILE_KEYS, compute_key
+
+COLORS = ('w', 'b')
+PIECE_TYPES = ('P', 'N', 'B', 'R', 'Q', 'K')
+PIECE_CODES = tuple(color + piece_type for color in COLORS for piece_type in PIECE_TYPES)
+
+# Squares are numbered rank * 8 + file using the same layout as the GUI board:
+# rank 0 is Black's back rank (a8 = 0) and rank 7 is White's back rank (h1 = 63).
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_FLAGS = (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                  ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+
+# Castling rights that survive a move touching each square (king or rook squares
+# drop the matching rights, whether the piece moves away or is captured there)
+CASTLING_KEEP = [WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE] * 64
+CASTLING_KEEP[0] &= ~BLACK_QUEENSIDE
+CASTLING_KEEP[4] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_KEEP[7] &= ~BLACK_KINGSIDE
+CASTLING_KEEP[56] &= ~WHITE_QUEENSIDE
+CASTLING_KEEP[60] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_KEEP[63] &= ~WHITE_KINGSIDE
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Packed position: a nibble per square (0 empty, else 1 + index in
+# PIECE_CODES, two squares a byte, low nibble first), side to move in bit 0
+# and castling in bits 1-4 of a flags byte, en passant square (0xFF for
+# none), halfmove clock and fullmove number
+PACK_FORMAT = struct.Struct('<32sBBHH')
+PACKED_SIZE = PACK_FORMAT.size
+NO_EP_SQUARE = 0xFF
+
+
+def square(file, rank):
+    return rank * 8 + file
+
+
+def square_file(sq):
+    return sq & 7
+
+
+def square_rank(sq):
+    return sq >> 3
+
+
+def square_name(sq):
+    return chr(ord('a') + (sq & 7)) + str(8 - (sq >> 3))
+
+
+def parse_square(name):
+    return square(ord(name[0]) - ord('a'), 8 - int(name[1]))
+
+
+def lsb(bb):
+    """Index of the lowest set bit"""
+    return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+    return bb.bit_count()
+
+
+def iter_squares(bb):
+    """Yield the index of every set bit, lowest first"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def opponent(color):
+    return 'b' if color == 'w' else 'w'
+
+
+def castling_string_to_mask(castling_rights):
+    mask = 0
+    for char, flag in CASTLING_FLAGS:
+        if char in castling_rights:
+            mask |= flag
+    return mask
+
+
+def castling_mask_to_string(mask):
+    return ''.join(char for char, flag in CASTLING_FLAGS if mask & flag)
+
+
+class Position:
+    """Chess position stored as twelve piece bitboards plus occupancy masks.
+
+    A mailbox copy of the pieces is kept in ``board`` (same ``board[rank][file]``
+    layout as ``main.initial_board``) so square lookups stay O(1), and
+    ``piece_lists``/``king_squares`` are kept in step with every put/remove so
+    a side's pieces can be walked without scanning the board.
+
+    ``key`` is the Zobrist key, updated incrementally by every put/remove and
+    by make_move. ``key_history`` holds the keys of the positions played
+    through since the position was built (or given by set_history), with ``key_counts`` counting them so
+    that most positions are ruled out as repetitions by one dict lookup.
+    ``null_plies`` marks where in the history the null moves still on the
+    board were played.
+    """
+
+    def __init__(self):
+        self.bitboards = {code: 0 for code in PIECE_CODES}
+        self.occupancy = {'w': 0, 'b': 0}
+        self.occupied = 0
+        self.board = [[''] * 8 for _ in range(8)]
+        self.piece_lists = {code: set() for code in PIECE_CODES}
+        self.king_squares = {'w': None, 'b': None}
+        self.side_to_move = 'w'
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.undo_stack = []
+        self.key = 0
+        self.key_history = []
+        self.key_counts = {}
+        self.null_plies = []
+
+    @classmethod
+    def from_board(cls, board, turn, castling_rights, last_move=None):
+        """Build a position from the GUI's list-of-strings board"""
+        pos = cls()
+        for rank in range(8):
+            for file in range(8):
+                piece = board[rank][file]
+                if piece:
+                    pos.put_piece(piece, square(file, rank))
+        pos.side_to_move = 'w' if turn else 'b'
+        pos.castling = castling_string_to_mask(castling_rights or '')
+        # A double pawn push on the previous move opens an en passant square
+        if last_move:
+            (start_file, start_rank), (end_file, end_rank) = last_move
+            piece = board[end_rank][end_file]
+            if piece and piece[1] == 'P' and abs(start_rank - end_rank) == 2:
+                pos.ep_square = square(end_file, (start_rank + end_rank) // 2)
+        pos.key = compute_key(pos)
+        return pos
+
+    @classmethod
+    def from_fen(cls, fen):
+        parts = fen.split()
+        pos = cls()
+        for rank, row in enumerate(parts[0].split('/')):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                else:
+                    color = 'w' if char.isupper() else 'b'
+                    pos.put_piece(color + char.upper(), square(file, rank))
+                    file += 1
+        pos.side_to_move = parts[1] if len(parts) > 1 else 'w'
+        pos.castling = castling_string_to_mask(parts[2]) if len(parts) > 2 and parts[2] != '-' else 0
+        if len(parts) > 3 and parts[3] != '-':
+            pos.ep_square = parse_square(parts[3])
+        if len(parts) > 4:
+            pos.halfmove_clock = int(parts[4])
+        if len(parts) > 5:
+            pos.fullmove_number = int(parts[5])
+        pos.key = compute_key(pos)
+        return pos
+
+    def pack(self):
+        """Fixed-size (PACKED_SIZE bytes) binary form, for sending to other processes.
+        The moves played to reach the position are not kept."""
+        squares = bytearray(32)
+        for index, code in enumerate(PIECE_CODES, 1):
+            for sq in self.piece_lists[code]:
+                squares[sq >> 1] |= index << ((sq & 1) << 2)
+        flags = (self.side_to_move == 'b') | (self.castling << 1)
+        ep = NO_EP_SQUARE if self.ep_square is None else self.ep_square
+        return PACK_FORMAT.pack(bytes(squares), flags, ep, min(self.halfmove_clock, 0xFFFF),
+                                min(self.fullmove_number, 0xFFFF))
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        """Position packed at offset of data (any bytes-like object)"""
+        squares, flags, ep, halfmove_clock, fullmove_number = PACK_FORMAT.unpack_from(data, offset)
+        pos = cls()
+        for byte_index, byte in enumerate(squares):
+            if byte & 0xF:
+                pos.put_piece(PIECE_CODES[(byte & 0xF) - 1], byte_index << 1)
+            if byte >> 4:
+                pos.put_piece(PIECE_CODES[(byte >> 4) - 1], (byte_index << 1) | 1)
+        pos.side_to_move = 'b' if flags & 1 else 'w'
+        pos.castling = flags >> 1
+        pos.ep_square = None if ep == NO_EP_SQUARE else ep
+        pos.halfmove_clock = halfmove_clock
+        pos.fullmove_number = fullmove_number
+        pos.key = compute_key(pos)
+        return pos
+
+    def to_board(self):
+        """Return a fresh list-of-strings board in the GUI layout"""
+        return [row[:] for row in self.board]
+
+    def fen(self):
+        rows = []
+        for rank in range(8):
+            empty = 0
+            row = ''
+            for piece in self.board[rank]:
+                if piece:
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += piece[1] if piece[0] == 'w' else piece[1].lower()
+                else:
+                    empty += 1
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        ep = square_name(self.ep_square) if self.ep_square is not None else '-'
+        return (f"{'/'.join(rows)} {self.side_to_move} {self.castling_rights or '-'} {ep} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def copy(self):
+        pos = Position()
+        pos.bitboards = dict(self.bitboards)
+        pos.occupancy = dict(self.occupancy)
+        pos.occupied = self.occupied
+        pos.board = self.to_board()
+        pos.piece_lists = {code: set(squares) for code, squares in self.piece_lists.items()}
+        pos.king_squares = dict(self.king_squares)
+        pos.side_to_move = self.side_to_move
+        pos.castling = self.castling
+        pos.ep_square = self.ep_square
+        pos.halfmove_clock = self.halfmove_clock
+        pos.fullmove_number = self.fullmove_number
+        pos.undo_stack = list(self.undo_stack)
+        pos.key = self.key
+        pos.key_history = list(self.key_history)
+        pos.key_counts = dict(self.key_counts)
+        pos.null_plies = list(self.null_plies)
+        return pos
+
+    @property
+    def castling_rights(self):
+        """Castling rights in the "KQkq" string format used by the GUI"""
+        return castling_mask_to_string(self.castling)
+
+    @property
+    def turn(self):
+        return self.side_to_move == 'w'
+
+    def put_piece(self, piece, sq):
+        bit = 1 << sq
+        self.bitboards[piece] |= bit
+        self.occupancy[piece[0]] |= bit
+        self.occupied |= bit
+        self.board[sq >> 3][sq & 7] = piece
+        self.piece_lists[piece].add(sq)
+        self.key ^= PIECE_KEYS[piece][sq]
+        if piece[1] == 'K':
+            self.king_squares[piece[0]] = sq
+
+    def remove_piece(self, sq):
+        piece = self.board[sq >> 3][sq & 7]
+        if piece:
+            mask = ~(1 << sq)
+            self.bitboards[piece] &= mask
+            self.occupancy[piece[0]] &= mask
+            self.occupied &= mask
+            self.board[sq >> 3][sq & 7] = ''
+            self.piece_lists[piece].discard(sq)
+            self.key ^= PIECE_KEYS[piece][sq]
+        return piece
+
+    def piece_at(self, sq):
+        return self.board[sq >> 3][sq & 7]
+
+    def pieces(self, color, piece_type):
+        return self.bitboards[color + piece_type]
+
+    def king_square(self, color):
+        return self.king_squares[color]
+
+    def piece_squares(self, color):
+        """Yield (piece, square) for every piece of color, at most 16 entries"""
+        for piece_type in PIECE_TYPES:
+            piece = color + piece_type
+            for sq in self.piece_lists[piece]:
+                yield piece, sq
+
+    def attackers_to(self, sq, color, occupied=None):
+        """Bitboard of color's pieces attacking sq, given an optional occupancy"""
+        if occupied is None:
+            occupied = self.occupied
+        bb = self.bitboards
+        queens = bb[color + 'Q']
+        return ((PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & bb[color + 'P'])
+                | (KNIGHT_ATTACKS[sq] & bb[color + 'N'])
+                | (KING_ATTACKS[sq] & bb[color + 'K'])
+                | (BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]] & (bb[color + 'B'] | queens))
+                | (ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] & (bb[color + 'R'] | queens))) & occupied
+
+    def is_square_attacked(self, sq, by_color):
+        return self.attackers_to(sq, by_color) != 0
+
+    def in_check(self, color=None):
+        """Whether color's king (default: side to move) is attacked"""
+        if color is None:
+            color = self.side_to_move
+        king_sq = self.king_squares[color]
+        if king_sq is None:
+            return False
+        return self.attackers_to(king_sq, 'b' if color == 'w' else 'w') != 0
+
+    def has_non_pawn_material(self, color):
+        """Whether color has a knight, bishop, rook or queen (no pawn-ending zugzwang)"""
+        bb = self.bitboards
+        return bool(bb[color + 'N'] | bb[color + 'B'] | bb[color + 'R'] | bb[color + 'Q'])
+
+    def make_null_move(self):
+        """Pass the turn (null-move pruning); take it back with unmake_null_move"""
+        self.undo_stack.append((NULL_MOVE, None, None, None, None,
+                                self.castling, self.ep_square, self.halfmove_clock))
+        # Kept for unmake_null_move but not counted: no repetition is looked
+        # for in the positions before the pass (see is_repetition)
+        self.key_history.append(self.key)
+        self.null_plies.append(len(self.key_history))
+        key = self.key ^ SIDE_KEY
+        if self.ep_square is not None:
+            key ^= EP_FILE_KEYS[self.ep_square & 7]
+            self.ep_square = None
+        self.key = key
+        self.halfmove_clock += 1
+        self.side_to_move = 'b' if self.side_to_move == 'w' else 'w'
+
+    def unmake_null_move(self):
+        (_, _, _, _, _, self.castling, self.ep_square, self.halfmove_clock) = self.undo_stack.pop()
+        self.key = self.key_history.pop()
+        self.null_plies.pop()
+        self.side_to_move = 'b' if self.side_to_move == 'w' else 'w'
+
+    def set_history(self, keys):
+        """Take keys, oldest first, as the positions played before this one,
+        for positions built without the moves that led to them"""
+        self.key_history = list(keys)
+        self.key_counts = {}
+        for key in self.key_history:
+            self.key_counts[key] = self.key_counts.get(key, 0) + 1
+        self.null_plies = []
+
+    def is_repetition(self):
+        """Whether the current position already occurred since the last capture,
+        pawn move or null move"""
+        key = self.key
+        if key not in self.key_counts:
+            return False
+        history = self.key_history
+        first = len(history) - self.halfmove_clock
+        if self.null_plies:
+            # Positions from before a pass were not reached in the line being searched
+            first = max(first, self.null_plies[-1])
+        # Same side to move every other ply
+        for index in range(len(history) - 2, max(first, 0) - 1, -2):
+            if history[index] == key:
+                return True
+        return False
+
+    def make_move(self, move):
+        """Play an encoded move in place and push what is needed to undo it"""
+        key = self.key
+        self.key_history.append(key)
+        self.key_counts[key] = self.key_counts.get(key, 0) + 1
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flags = move >> 12
+        piece = self.board[from_sq >> 3][from_sq & 7]
+        color = piece[0]
+        captured_sq = to_sq
+        if flags == EP_CAPTURE:
+            # The captured pawn sits behind the destination square
+            captured_sq = to_sq + 8 if color == 'w' else to_sq - 8
+        captured = self.remove_piece(captured_sq)
+
+        rook_move = None
+        if flags == KING_CASTLE:
+            rook_move = (from_sq + 3, from_sq + 1)
+        elif flags == QUEEN_CASTLE:
+            rook_move = (from_sq - 4, from_sq - 1)
+
+        self.undo_stack.append((move, piece, captured, captured_sq, rook_move,
+                                self.castling, self.ep_square, self.halfmove_clock))
+
+        self.remove_piece(from_sq)
+        if flags & PROMOTION:
+            self.put_piece(color + PROMOTION_PIECES[flags & 3], to_sq)
+        else:
+            self.put_piece(piece, to_sq)
+        if rook_move:
+            self.put_piece(self.remove_piece(rook_move[0]), rook_move[1])
+
+        # The piece keys were updated by put/remove; the rest changes here
+        key = self.key ^ SIDE_KEY ^ CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            key ^= EP_FILE_KEYS[self.ep_square & 7]
+        self.castling &= CASTLING_KEEP[from_sq] & CASTLING_KEEP[to_sq]
+        key ^= CASTLING_KEYS[self.castling]
+        if flags == DOUBLE_PUSH:
+            self.ep_square = (from_sq + to_sq) // 2
+            key ^= EP_FILE_KEYS[self.ep_square & 7]
+        else:
+            self.ep_square = None
+        self.key = key
+        self.halfmove_clock = 0 if captured or piece[1] == 'P' else self.halfmove_clock + 1
+        if color == 'b':
+            self.fullmove_number += 1
+        self.side_to_move = 'b' if color == 'w' else 'w'
+
+    def unmake_move(self):
+        """Take back the last move played with make_move"""
+        (move, piece, captured, captured_sq, rook_move,
+         self.castling, self.ep_square, self.halfmove_clock) = self.undo_stack.pop()
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        if rook_move:
+            self.put_piece(self.remove_piece(rook_move[1]), rook_move[0])
+        self.remove_piece(to_sq)
+        self.put_piece(piece, from_sq)
+        if captured:
+            self.put_piece(captured, captured_sq)
+        if piece[0] == 'b':
+            self.fullmove_number -= 1
+        self.side_to_move = piece[0]
+        # Restore the key from the history rather than undoing each XOR
+        key = self.key = self.key_history.pop()
+        count = self.key_counts[key] - 1
+        if count:
+            self.key_counts[key] = count
+        else:
+            del self.key_counts[key]
@@ -0,0 +1,535 @@
+"""Iterative deepening search.
+
+Search.iterate runs iterative deepening on a copy of a position and yields a
+SearchResult after every completed iteration, so callers can follow the
+search as it deepens. The search ends when a SearchLimits limit is reached or
+when the stop event, a threading.Event usually set from another thread, is
+set; the running iteration is then abandoned within a few thousand nodes.
+A search given a ponderhit event ponders: the clock only counts once the
+event is set (see time_manager).
+
+The engine state (transposition table, move ordering tables, evaluation
+cache) lives on the Search and carries over from one search to the next.
+"""
+import math
+import struct
+
+from evaluation import Evaluation, PIECE_VALUES
+from move_picker import MovePicker
+from ordering import MoveOrdering
+from moves import NULL_MOVE, EP_CAPTURE, PROMOTION_PIECES, move_to_uci
+from time_manager import TimeManager
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+MAX_DEPTH = 64
+# Captures that cannot lift the stand-pat score to within this margin of the
+# window are not searched in quiescence
+DELTA_MARGIN = 200
+# Deepest iteration of iterative deepening
+MAX_SEARCH_DEPTH = 32
+
+# Mate in n plies scores MATE_SCORE - n; anything beyond MATE_BOUND is a mate
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000
+
+# Root window around the previous score, doubled on every fail until it
+# passes ASPIRATION_LIMIT and the failing side opens fully
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 50
+ASPIRATION_LIMIT = 400
+
+# Selective search. Margins and counts are indexed by remaining depth
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 3  # Plus one for every NULL_MOVE_DEPTH_STEP plies of depth
+NULL_MOVE_DEPTH_STEP = 4
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # Moves searched at full depth before reducing
+LMR_HISTORY_THRESHOLD = 64
+# Reduction of the move_count-th move at depth, growing with the log of both
+LMR_REDUCTIONS = [[0] * 64] + [[0] + [int(0.75 + math.log(depth) * math.log(move_count) / 2.25)
+                                      for move_count in range(1, 64)]
+                               for depth in range(1, MAX_DEPTH + 1)]
+# A static score this far above beta near the frontier is returned as is
+REVERSE_FUTILITY_MARGINS = (0, 100, 200, 300, 400, 500, 600)
+FUTILITY_MARGINS = (0, 150, 250, 350, 450)
+RAZOR_MARGINS = (0, 300, 500)
+# Quiet moves searched before the rest are pruned (move count pruning)
+LATE_MOVE_COUNTS = (0, 5, 8, 13, 20)
+
+# Packed SearchLimits: times as doubles (NaN for none), counts as signed
+# integers (-1 for none)
+LIMITS_FORMAT = struct.Struct('<ddqdqq')
+# Packed SearchResult: depth, complete, PV length, score, nodes, nps,
+# elapsed, then the PV padded with null moves
+PACKED_PV_LENGTH = MAX_DEPTH
+RESULT_FORMAT = struct.Struct(f'<BBBdQQd{PACKED_PV_LENGTH}H')
+
+
+def score_to_tt(score, ply):
+    """Mate scores are stored relative to the node, not the root"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchLimits:
+    """When a search stops: the clock (time_left, increment, moves_to_go), a
+    fixed movetime, a depth or a node count, in any combination. Times are in
+    seconds. Without any limit the search runs until it is stopped."""
+
+    def __init__(self, time_left=None, increment=0.0, moves_to_go=None, movetime=None,
+                 depth=None, nodes=None):
+        self.time_left = time_left
+        self.increment = increment
+        self.moves_to_go = moves_to_go
+        self.movetime = movetime
+        self.depth = depth
+        self.nodes = nodes
+
+    def is_infinite(self):
+        return (self.time_left is None and self.movetime is None
+                and self.depth is None and self.nodes is None)
+
+    def pack(self):
+        """Fixed-size (LIMITS_FORMAT.size bytes) binary form"""
+        return LIMITS_FORMAT.pack(
+            math.nan if self.time_left is None else self.time_left, self.increment,
+            -1 if self.moves_to_go is None else self.moves_to_go,
+            math.nan if self.movetime is None else self.movetime,
+            -1 if self.depth is None else self.depth, -1 if self.nodes is None else self.nodes)
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        time_left, increment, moves_to_go, movetime, depth, nodes = LIMITS_FORMAT.unpack_from(data, offset)
+        return cls(None if math.isnan(time_left) else time_left, increment,
+                   None if moves_to_go < 0 else moves_to_go, None if math.isnan(movetime) else movetime,
+                   None if depth < 0 else depth, None if nodes < 0 else nodes)
+
+    def time_manager(self, stop_event=None, ponderhit_event=None):
+        return TimeManager(self.time_left, self.increment, self.moves_to_go, self.movetime,
+                           self.depth, self.nodes, stop_event=stop_event,
+                           ponderhit_event=ponderhit_event)
+
+
+class SearchResult:
+    """State of the search after an iteration.
+
+    score is from the side to move's point of view. complete is False for
+    the last result of a search cut off in the middle of an iteration: its
+    move is the best one found so far at that depth (depth 0 when not even
+    the first iteration got through a root move).
+    """
+    __slots__ = ('depth', 'score', 'pv', 'nodes', 'nps', 'elapsed', 'complete')
+
+    def __init__(self, depth, score, pv, nodes, nps, elapsed, complete=True):
+        self.depth = depth
+        self.score = score
+        self.pv = pv
+        self.nodes = nodes
+        self.nps = nps
+        self.elapsed = elapsed
+        self.complete = complete
+
+    @property
+    def move(self):
+        return self.pv[0] if self.pv else None
+
+    def is_mate(self):
+        return abs(self.score) >= MATE_BOUND
+
+    def pack(self):
+        """Fixed-size (RESULT_FORMAT.size bytes) binary form"""
+        pv = self.pv[:PACKED_PV_LENGTH]
+        return RESULT_FORMAT.pack(self.depth, self.complete, len(pv), self.score, self.nodes,
+                                  self.nps, self.elapsed,
+                                  *pv, *[NULL_MOVE] * (PACKED_PV_LENGTH - len(pv)))
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        depth, complete, pv_length, score, nodes, nps, elapsed, *pv = RESULT_FORMAT.unpack_from(data, offset)
+        return cls(depth, score, pv[:pv_length], nodes, nps, elapsed, bool(complete))
+
+    def __repr__(self):
+        return (f"SearchResult(depth={self.depth}, score={self.score}, "
+                f"pv={' '.join(move_to_uci(move) for move in self.pv)!r}, nodes={self.nodes}, "
+                f"nps={self.nps}, elapsed={self.elapsed:.3f}, complete={self.complete})")
+
+
+class Search:
+    def __init__(self, hash_size_mb=16, evaluator=None, transposition_table=None):
+        self.evaluator = evaluator or Evaluation()
+        # Killers per ply, history and countermoves
+        self.ordering = MoveOrdering(MAX_DEPTH + 1)
+        # Principal variation from each ply, rebuilt as the search backs up
+        self.pv_table = [[] for _ in range(MAX_DEPTH + 2)]
+        self.previous_pv = []
+        self.root_moves = []
+        self.root_ply = 0
+        self.partial_result = None
+        self.time_manager = TimeManager(depth=1)
+        if transposition_table is None:
+            transposition_table = TranspositionTable(hash_size_mb)
+        self.transposition_table = transposition_table
+        # Selective search switches, mostly for benchmarking one against another
+        self.use_null_move = True
+        self.use_lmr = True
+        self.use_futility = True
+        self.use_razoring = True
+
+    def iterate(self, position, limits=None, stop_event=None, depth_offset=0, ponderhit_event=None):
+        """Iterative deepening on a copy of position, yielding a SearchResult
+        after every completed iteration. The first iteration searches
+        1 + depth_offset plies.
+
+        When the search is cut off, a last result with complete=False is
+        yielded if the unfinished iteration found a move, or if nothing was
+        yielded at all. Nothing is yielded when the side to move has no move.
+        """
+        limits = limits or SearchLimits()
+        time_manager = self.time_manager = limits.time_manager(stop_event, ponderhit_event)
+        position = position.copy()
+        self.transposition_table.new_search()
+        self.ordering.new_search()
+        self.root_ply = len(position.undo_stack)
+        self.previous_pv = []
+        entry = self.transposition_table.probe(position.key)
+        hash_move = entry.move if entry else NULL_MOVE
+        # [move, score] pairs, re-sorted after every iteration
+        self.root_moves = [[move, -math.inf] for move in MovePicker(position, hash_move)]
+        if not self.root_moves:
+            return
+
+        score = 0
+        yielded = False
+        for depth in range(min(1 + depth_offset, MAX_SEARCH_DEPTH), MAX_SEARCH_DEPTH + 1):
+            if not time_manager.can_start_iteration(depth):
+                break
+
+            self.partial_result = None
+            try:
+                score, move = self.aspiration_search(position, depth, score)
+            except TimeoutError:
+                if self.partial_result:
+                    partial_score, pv = self.partial_result
+                    yield self.result(depth, partial_score, pv, complete=False)
+                    yielded = True
+                break
+
+            yielded = True
+            self.previous_pv = self.pv_table[0]
+            # Next iteration: best move first, the rest by this iteration's scores
+            self.root_moves.sort(key=lambda root_move: (root_move[0] != move, -root_move[1]))
+            yield self.result(depth, score, list(self.previous_pv))
+
+        if not yielded:
+            # Played if not even the first root move was searched
+            yield self.result(0, 0, [self.root_moves[0][0]], complete=False)
+
+    def search(self, position, limits=None, stop_event=None, ponderhit_event=None):
+        """Run iterate to the end and return its last result (None without a legal move)"""
+        result = None
+        for result in self.iterate(position, limits, stop_event, ponderhit_event=ponderhit_event):
+            pass
+        return result
+
+    def result(self, depth, score, pv, complete=True):
+        time_manager = self.time_manager
+        return SearchResult(depth, score, pv, time_manager.nodes, time_manager.nps(),
+                            time_manager.elapsed(), complete)
+
+    def aspiration_search(self, position, depth, previous_score):
+        """Root search in a narrow window around the previous iteration's score,
+        widened on the failing side until the score falls inside it"""
+        if depth < ASPIRATION_MIN_DEPTH or abs(previous_score) >= MATE_BOUND:
+            return self.search_root(position, depth, -math.inf, math.inf)
+        delta = ASPIRATION_WINDOW
+        kappa = previous_score - delta
+        beta = previous_score + delta
+        while True:
+            score, move = self.search_root(position, depth, kappa, beta)
+            if score <= kappa:
+                kappa = -math.inf if delta >= ASPIRATION_LIMIT else score - delta
+            elif score >= beta:
+                beta = math.inf if delta >= ASPIRATION_LIMIT else score + delta
+            else:
+                return score, move
+            delta *= 2
+
+    def search_root(self, position, depth, kappa, beta):
+        """PVS over self.root_moves in their current order, recording each move's score"""
+        self.pv_table[0] = []
+        if position.in_check():
+            depth += 1
+        best_value = -math.inf
+        best_move = None
+        for index, root_move in enumerate(self.root_moves):
+            move = root_move[0]
+            position.make_move(move)
+            try:
+                if index == 0:
+                    value = -self.alphabeta_search(position, depth - 1, -beta, -kappa,
+                                                   1)[0]
+                else:
+                    value = -self.alphabeta_search(position, depth - 1, -kappa - 1, -kappa,
+                                                   1)[0]
+                    if kappa < value < beta:
+                        value = -self.alphabeta_search(position, depth - 1, -beta, -kappa,
+                                                       1)[0]
+            finally:
+                position.unmake_move()
+            root_move[1] = value
+
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if value > kappa:
+                    kappa = value
+                    self.pv_table[0] = [move] + self.pv_table[1]
+                    # Good enough to play if the iteration does not finish
+                    self.partial_result = (value, self.pv_table[0])
+            if kappa >= beta:
+                break
+
+        bound = LOWER if best_value >= beta else EXACT if self.pv_table[0] else UPPER
+        self.transposition_table.store(position.key, depth, bound, score_to_tt(best_value, 0), best_move)
+        return best_value, best_move
+
+    def alphabeta_search(self, position, depth, kappa, beta, ply, allow_null=True):
+        """Negamax principal variation search.
+
+        Scores are from the side to move's point of view. The first move is
+        searched with the full (kappa, beta) window and the others with a null
+        window that only proves them worse, re-searched when they are not.
+        Returns (score, best move); the move is None when no move was searched.
+        """
+        self.time_manager.tick()
+        self.pv_table[ply] = []
+            
+        # A repeated position (or fifty reversible moves) is a draw
+        if ply and (position.is_repetition() or position.halfmove_clock >= 100):
+            return 0, None
+            
+        # Check extension: a side in check gets one more ply to find its way out,
+        # and a leaf in check is never evaluated statically
+        in_check = position.in_check()
+        if in_check:
+            depth += 1
+            
+        # Leaf node: resolve captures before trusting the static evaluation
+        if depth <= 0 or ply >= MAX_DEPTH:
+            return self.quiescence_search(position, kappa, beta, ply), None
+
+        pv_node = beta - kappa > 1
+            
+        # A deep enough entry can end the search of this node; any entry
+        # supplies the move to try first
+        key = position.key
+        entry = self.transposition_table.probe(key)
+        hash_move = NULL_MOVE
+        if entry:
+            hash_move = entry.move
+            if not pv_node and entry.depth >= depth:
+                score = score_from_tt(entry.score, ply)
+                if (entry.bound == EXACT or (entry.bound == LOWER and score >= beta)
+                        or (entry.bound == UPPER and score <= kappa)):
+                    return score, entry.move or None
+        # On the previous iteration's principal variation its move goes first
+        if pv_node and ply < len(self.previous_pv) and self.on_previous_pv(position, ply):
+            hash_move = self.previous_pv[ply]
+        original_kappa = kappa
+
+        # Selective search away from the principal variation, never in check
+        selective = not pv_node and not in_check
+        static_eval = self.evaluator.evaluate(position, position.side_to_move) if selective else None
+
+        # Razoring: far below the window near the frontier, only captures can help
+        if selective and self.use_razoring and depth <= 2 and static_eval + RAZOR_MARGINS[depth] <= kappa:
+            value = self.quiescence_search(position, kappa, beta, ply)
+            if value <= kappa:
+                return value, None
+
+        # Reverse futility: so far above beta near the frontier that no
+        # reply is expected to bring the score back
+        if (selective and self.use_futility and depth < len(REVERSE_FUTILITY_MARGINS)
+                and static_eval - REVERSE_FUTILITY_MARGINS[depth] >= beta
+                and abs(beta) < MATE_BOUND):
+            return static_eval, None
+
+        # Null move: if passing still holds beta, a real move will too.
+        # Skipped without pieces, where passing would hide zugzwang
+        if (selective and self.use_null_move and allow_null and depth >= NULL_MOVE_MIN_DEPTH
+                and static_eval >= beta and position.has_non_pawn_material(position.side_to_move)):
+            reduction = NULL_MOVE_REDUCTION + depth // NULL_MOVE_DEPTH_STEP
+            position.make_null_move()
+            try:
+                value, _ = self.alphabeta_search(position, depth - 1 - reduction, -beta, -beta + 1,
+                                                 ply + 1, False)
+            finally:
+                position.unmake_null_move()
+            if -value >= beta:
+                return beta, None
+
+        # Futility pruning: near the frontier a quiet move cannot make up
+        # a static score this far below kappa
+        futile = (selective and self.use_futility and depth < len(FUTILITY_MARGINS)
+                  and static_eval + FUTILITY_MARGINS[depth] <= kappa)
+        # Move count pruning: near the frontier, late quiet moves are not searched
+        late_moves = (LATE_MOVE_COUNTS[depth] if selective and self.use_futility
+                      and depth < len(LATE_MOVE_COUNTS) else 0)
+
+        # Moves come out of the picker stage by stage, so a cutoff on an early
+        # move skips generating (and ordering) the rest
+        ordering = self.ordering
+        killers = ordering.killers_at(ply)
+        previous_move = position.undo_stack[-1][0] if position.undo_stack else NULL_MOVE
+        picker = MovePicker(position, hash_move, ordering, ply)
+        gives_check = picker.generator.gives_check
+        
+        best_move = None
+        best_value = -math.inf
+        move_count = 0
+        quiets_tried = []
+        
+        for move in picker:
+            move_count += 1
+            quiet = not move & 0xC000
+            checking = quiet and gives_check(move)
+
+            if futile and quiet and not checking and move_count > 1:
+                # Count the pruned move as failing low at the futility bound
+                best_value = max(best_value, static_eval + FUTILITY_MARGINS[depth])
+                continue
+            if late_moves and quiet and not checking and move_count > late_moves:
+                continue
+
+            # Late move reductions: quiet moves ordered late are searched
+            # shallower first, less so when their history is good
+            reduction = 0
+            if (self.use_lmr and depth >= LMR_MIN_DEPTH and move_count > LMR_MIN_MOVES and quiet
+                    and not in_check and not checking and move not in killers):
+                reduction = LMR_REDUCTIONS[min(depth, MAX_DEPTH)][min(move_count, 63)]
+                if ordering.history_score(move) >= LMR_HISTORY_THRESHOLD:
+                    reduction -= 1
+                if pv_node:
+                    reduction -= 1
+                reduction = max(0, min(reduction, depth - 2))
+
+            # Play the move on the shared position and take it back afterwards
+            position.make_move(move)
+            try:
+                if move_count == 1:
+                    value = -self.alphabeta_search(position, depth - 1, -beta, -kappa,
+                                                   ply + 1)[0]
+                else:
+                    # Null window first (reduced for late quiet moves); a move
+                    # that beats kappa is searched again at full depth, then
+                    # with the full window if it may land inside it
+                    value = -self.alphabeta_search(position, depth - 1 - reduction, -kappa - 1, -kappa,
+                                                   ply + 1)[0]
+                    if reduction and value > kappa:
+                        value = -self.alphabeta_search(position, depth - 1, -kappa - 1, -kappa,
+                                                       ply + 1)[0]
+                    if kappa < value < beta:
+                        value = -self.alphabeta_search(position, depth - 1, -beta, -kappa,
+                                                       ply + 1)[0]
+            finally:
+                position.unmake_move()
+            
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if value > kappa:
+                    kappa = value
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    
+            # Beta cutoff
+            if kappa >= beta:
+                if quiet:
+                    # Quiet move: remember it for sibling nodes
+                    ordering.update_quiet_cutoff(move, ply, depth, previous_move, quiets_tried)
+                break
+            if quiet:
+                quiets_tried.append(move)
+        
+        # The picker yielded nothing: checkmate or stalemate
+        if not move_count:
+            return (-MATE_SCORE + ply if in_check else 0), None
+        
+        if best_value <= original_kappa:
+            bound = UPPER
+        elif best_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.transposition_table.store(key, depth, bound, score_to_tt(best_value, ply), best_move or NULL_MOVE)
+                
+        return best_value, best_move
+
+    def on_previous_pv(self, position, ply):
+        """Whether the moves played since the root follow the previous principal variation"""
+        played = position.undo_stack[self.root_ply:]
+        return all(undo[0] == pv_move for undo, pv_move in zip(played, self.previous_pv[:ply]))
+
+    def quiescence_search(self, position, kappa, beta, ply):
+        """Search captures and promotions only, until the position is quiet.
+
+        Scores are from the side to move's point of view. The side to move may
+        stand pat on the static evaluation instead of capturing, except in
+        check where every evasion is searched.
+        """
+        self.time_manager.tick()
+
+        in_check = position.in_check()
+        if in_check:
+            stand_pat = best_value = -math.inf
+        else:
+            stand_pat = best_value = self.evaluator.evaluate(position, position.side_to_move)
+            if stand_pat >= beta:
+                return stand_pat
+            kappa = max(kappa, stand_pat)
+
+        board = position.board
+        searched = False
+        # The picker leaves out captures that lose material by SEE
+        for move in MovePicker(position, captures_only=True):
+            # Delta pruning: skip captures that cannot reach kappa even when
+            # the captured material comes for free
+            if not in_check:
+                to_sq = (move >> 6) & 63
+                victim = board[to_sq >> 3][to_sq & 7]
+                gain = PIECE_VALUES[victim[1]] if victim else 0
+                if move >> 12 == EP_CAPTURE:
+                    gain = PIECE_VALUES['P']
+                if move & 0x8000:
+                    gain += PIECE_VALUES[PROMOTION_PIECES[(move >> 12) & 3]] - PIECE_VALUES['P']
+                if stand_pat + gain + DELTA_MARGIN <= kappa:
+                    continue
+
+            searched = True
+            position.make_move(move)
+            try:
+                value = -self.quiescence_search(position, -beta, -kappa, ply + 1)
+            finally:
+                position.unmake_move()
+
+            if value > best_value:
+                best_value = value
+                if value > kappa:
+                    kappa = value
+            if kappa >= beta:
+                break
+
+        # No way out of check
+        if in_check and not searched:
+            return -MATE_SCORE + ply
+        return best_value
@@ -0,0 +1,117 @@
+"""Static exchange evaluation.
+
+Plays out the capture sequence on the destination square of a move, each
+side recapturing with its least valuable attacker, and scores the material
+balance for the side making the move when both sides may stop capturing at
+any point. Sliders hidden behind a piece that captures (x-rays) join the
+sequence as soon as the square in front of them is vacated. Pins are not
+taken into account.
+"""
+from attacks import rook_attacks, bishop_attacks
+from evaluation import PIECE_VALUES
+from moves import KING_CASTLE, QUEEN_CASTLE, EP_CAPTURE, PROMOTION_PIECES
+
+EXCHANGE_ORDER = ('P', 'N', 'B', 'R', 'Q', 'K')
+
+
+def _initial_exchange(position, move):
+    """Value captured by the move, value of the piece left on the square, and the occupancy after it"""
+    board = position.board
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    flags = move >> 12
+    occupied = position.occupied ^ (1 << from_sq)
+    attacker = board[from_sq >> 3][from_sq & 7][1]
+    victim = board[to_sq >> 3][to_sq & 7]
+    gain = PIECE_VALUES[victim[1]] if victim else 0
+    if flags == EP_CAPTURE:
+        captured_sq = (from_sq & ~7) | (to_sq & 7)
+        occupied ^= 1 << captured_sq
+        gain = PIECE_VALUES['P']
+    if flags & 8:
+        attacker = PROMOTION_PIECES[flags & 3]
+        gain += PIECE_VALUES[attacker] - PIECE_VALUES['P']
+    return gain, PIECE_VALUES[attacker], occupied
+
+
+def _attackers(position, sq, occupied):
+    return (position.attackers_to(sq, 'w', occupied) | position.attackers_to(sq, 'b', occupied)) & occupied
+
+
+def _least_valuable(position, attackers, color):
+    bitboards = position.bitboards
+    for piece_type in EXCHANGE_ORDER:
+        pieces = attackers & bitboards[color + piece_type]
+        if pieces:
+            return piece_type, pieces & -pieces
+    return None, 0
+
+
+def _add_xrays(position, sq, attackers, occupied, piece_type):
+    """Sliders uncovered after a piece of piece_type left the line to sq"""
+    bb = position.bitboards
+    if piece_type in ('P', 'B', 'Q'):
+        attackers |= bishop_attacks(sq, occupied) & (bb['wB'] | bb['bB'] | bb['wQ'] | bb['bQ'])
+    if piece_type in ('R', 'Q'):
+        attackers |= rook_attacks(sq, occupied) & (bb['wR'] | bb['bR'] | bb['wQ'] | bb['bQ'])
+    return attackers & occupied
+
+
+def see(position, move):
+    """Material won (negative: lost) by the side to move through the full exchange started by move"""
+    if move >> 12 in (KING_CASTLE, QUEEN_CASTLE):
+        return 0
+    to_sq = (move >> 6) & 63
+    value, on_square, occupied = _initial_exchange(position, move)
+    gains = [value]
+    color = 'b' if position.board[(move & 63) >> 3][move & 7][0] == 'w' else 'w'
+    attackers = _attackers(position, to_sq, occupied)
+    while True:
+        piece_type, bit = _least_valuable(position, attackers & position.occupancy[color], color)
+        if not bit:
+            break
+        if piece_type == 'K' and attackers & ~position.occupancy[color] & occupied & ~bit:
+            break  # The king cannot capture into a defended square
+        # Balance if this capture is made, relative to the side making it
+        gains.append(on_square - gains[-1])
+        on_square = PIECE_VALUES[piece_type]
+        occupied ^= bit
+        attackers = _add_xrays(position, to_sq, attackers & occupied, occupied, piece_type)
+        color = 'b' if color == 'w' else 'w'
+    # Either side may decline to recapture, so fold the sequence back from the end
+    for index in range(len(gains) - 1, 0, -1):
+        gains[index - 1] = -max(-gains[index - 1], gains[index])
+    return gains[0]
+
+
+def see_ge(position, move, threshold=0):
+    """Whether see(position, move) >= threshold, stopping as soon as the answer is known"""
+    if move >> 12 in (KING_CASTLE, QUEEN_CASTLE):
+        return threshold <= 0
+    to_sq = (move >> 6) & 63
+    swap, on_square, occupied = _initial_exchange(position, move)
+    swap -= threshold
+    if swap < 0:
+        return False  # Even an uncontested capture does not reach the threshold
+    swap = on_square - swap
+    if swap <= 0:
+        return True  # Losing the moved piece still leaves us at the threshold
+    color = position.board[(move & 63) >> 3][move & 7][0]
+    attackers = _attackers(position, to_sq, occupied)
+    result = True
+    while True:
+        color = 'b' if color == 'w' else 'w'
+        attackers &= occupied
+        piece_type, bit = _least_valuable(position, attackers & position.occupancy[color], color)
+        if not bit:
+            break
+        result = not result
+        if piece_type == 'K':
+            # Capturing with the king only works if the other side has nothing left
+            return not result if attackers & ~position.occupancy[color] else result
+        swap = PIECE_VALUES[piece_type] - swap
+        if swap < result:
+            break
+        occupied ^= bit
+        attackers = _add_xrays(position, to_sq, attackers, occupied, piece_type)
+    return result
@@ -0,0 +1,259 @@
+"""Lazy SMP: several processes searching the same root position.
+
+Every worker runs an ordinary Search on the root position. They only
+cooperate through one transposition table kept in shared memory, which the
+table's key XOR data layout keeps consistent without locks. Workers with an
+odd index start one ply deeper, so they run ahead of the others and fill the
+table with deeper entries. Processes rather than threads, because the search
+holds the GIL the whole time it runs.
+
+The workers stay up between searches, so the evaluation cache and the
+ordering tables warm up as a game goes on. Tasks and results travel packed
+through shared-memory rings (see ipc), not pickled. Run this module to print a
+scaling report: python smp.py [max_workers] [depth]
+"""
+import multiprocessing
+import queue
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+from ipc import RingBuffer
+from position import Position, PACKED_SIZE
+from search import Search, SearchLimits, SearchResult, LIMITS_FORMAT, RESULT_FORMAT
+from transposition import TranspositionTable, table_bytes
+
+# How often the collecting process looks at the caller's stop event (seconds)
+POLL_INTERVAL = 0.01
+# Task record: kind, search id, whether to ponder, then the packed limits,
+# root position and the keys of the positions played before the root since
+# the last capture or pawn move (for repetitions), padded with zeros
+TASK_HEADER = struct.Struct('<BQB')
+HISTORY_LENGTH = 100
+HISTORY_FORMAT = struct.Struct(f'<H{HISTORY_LENGTH}Q')
+TASK_SIZE = TASK_HEADER.size + LIMITS_FORMAT.size + PACKED_SIZE + HISTORY_FORMAT.size
+SEARCH_TASK = 1
+QUIT_TASK = 2
+# Report record: search id, worker index, whether the worker is done with
+# the search and its node count, then the packed result unless it is done.
+# The done report also carries the worker's table probes and hits
+REPORT_HEADER = struct.Struct('<QHBQ')
+TABLE_STATS = struct.Struct('<QQ')
+REPORT_SIZE = REPORT_HEADER.size + max(RESULT_FORMAT.size, TABLE_STATS.size)
+REPORT_SLOTS = 256
+# Positions searched by the scaling report
+REPORT_FENS = (
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R b KQ - 0 8',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+)
+
+
+def depth_offset(index):
+    return index % 2
+
+
+def _worker_main(index, shm_name, tasks, results, stop_event, ponderhit_event):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        search = Search(transposition_table=TranspositionTable(buffer=shm.buf))
+        while True:
+            task = tasks.get()
+            kind, search_id, ponder = TASK_HEADER.unpack_from(task)
+            if kind == QUIT_TASK:
+                break
+            limits = SearchLimits.unpack(task, TASK_HEADER.size)
+            position = Position.unpack(task, TASK_HEADER.size + LIMITS_FORMAT.size)
+            history_length, *history = HISTORY_FORMAT.unpack_from(
+                task, TASK_HEADER.size + LIMITS_FORMAT.size + PACKED_SIZE)
+            position.set_history(history[:history_length])
+            for result in search.iterate(position, limits, stop_event, depth_offset(index),
+                                         ponderhit_event if ponder else None):
+                results.put(REPORT_HEADER.pack(search_id, index, False, result.nodes) + result.pack())
+            # Nothing more from this worker for the search
+            results.put(REPORT_HEADER.pack(search_id, index, True, search.time_manager.nodes)
+                        + TABLE_STATS.pack(search.transposition_table.probes,
+                                           search.transposition_table.hits))
+        # The table's memoryview has to go before the shared memory can close
+        del search
+    finally:
+        tasks.close()
+        results.close()
+        shm.close()
+
+
+class ParallelSearch:
+    """Lazy SMP search over `threads` worker processes, with the same
+    iterate/search interface as Search.
+
+    The results are the deepest completed iterations of any worker, with
+    the nodes of all the workers. The first worker to finish its search
+    stops the others. Call close() (or use it as a context manager) to stop
+    the workers and free the shared table.
+    """
+
+    def __init__(self, threads=2, hash_size_mb=16):
+        self.threads = threads
+        context = multiprocessing.get_context()
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=table_bytes(hash_size_mb))
+        # Zeroes the shared words; also sums the workers' probes and hits
+        self.transposition_table = TranspositionTable(buffer=self.shared_memory.buf)
+        self.transposition_table.clear()
+        self.stop_event = context.Event()
+        self.ponderhit_event = context.Event()
+        self.results = RingBuffer(REPORT_SIZE, REPORT_SLOTS)
+        self.task_queues = []
+        self.workers = []
+        for index in range(threads):
+            tasks = RingBuffer(TASK_SIZE, 2)
+            worker = context.Process(target=_worker_main, daemon=True,
+                                     args=(index, self.shared_memory.name, tasks, self.results,
+                                           self.stop_event, self.ponderhit_event))
+            worker.start()
+            self.task_queues.append(tasks)
+            self.workers.append(worker)
+        self.search_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if not self.workers:
+            return
+        self.stop_event.set()
+        for tasks in self.task_queues:
+            tasks.put(TASK_HEADER.pack(QUIT_TASK, 0, False))
+        for worker in self.workers:
+            worker.join()
+        for tasks in self.task_queues:
+            tasks.close()
+        self.results.close()
+        self.workers = []
+        self.transposition_table = None
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+    def iterate(self, position, limits=None, stop_event=None, ponderhit_event=None):
+        """Search position on every worker, yielding a SearchResult each
+        time one of them completes an iteration deeper than any before.
+
+        As with Search.iterate, a search cut off mid-iteration may end with
+        an incomplete result, and nothing is yielded without a legal move.
+        The caller's stop and ponderhit events are relayed to the workers.
+        """
+        limits = limits or SearchLimits()
+        self.search_id += 1
+        self.stop_event.clear()
+        self.ponderhit_event.clear()
+        # Keep the age of the local view in step with the workers'
+        self.transposition_table.new_search()
+        start_time = time.time()
+        keys = position.key_history
+        history = keys[len(keys) - min(len(keys), position.halfmove_clock, HISTORY_LENGTH):]
+        task = (TASK_HEADER.pack(SEARCH_TASK, self.search_id, ponderhit_event is not None)
+                + limits.pack() + position.pack()
+                + HISTORY_FORMAT.pack(len(history), *history, *[0] * (HISTORY_LENGTH - len(history))))
+        for tasks in self.task_queues:
+            tasks.put(task)
+
+        nodes = [0] * self.threads
+        running = self.threads
+        best = None
+        unfinished = None
+        try:
+            while running:
+                if stop_event is not None and stop_event.is_set():
+                    self.stop_event.set()
+                if ponderhit_event is not None and ponderhit_event.is_set():
+                    self.ponderhit_event.set()
+                try:
+                    report = self.results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    self.check_workers()
+                    continue
+                search_id, index, done, worker_nodes = REPORT_HEADER.unpack_from(report)
+                # Late reports of an earlier search
+                if search_id != self.search_id:
+                    continue
+                nodes[index] = worker_nodes
+                if done:
+                    probes, hits = TABLE_STATS.unpack_from(report, REPORT_HEADER.size)
+                    self.transposition_table.probes += probes
+                    self.transposition_table.hits += hits
+                    running -= 1
+                    self.stop_event.set()
+                    continue
+                result = SearchResult.unpack(report, REPORT_HEADER.size)
+                if result.complete:
+                    if best is None or result.depth > best.depth:
+                        best = result
+                        yield self.combine(result, nodes, start_time)
+                elif unfinished is None or result.depth > unfinished.depth:
+                    unfinished = result
+        finally:
+            # A caller leaving early still has to collect the workers' reports,
+            # or they would fill the ring and hold up the next search
+            if running:
+                self.stop_event.set()
+            while running:
+                try:
+                    report = self.results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    self.check_workers()
+                    continue
+                search_id, _, done, _ = REPORT_HEADER.unpack_from(report)
+                if search_id == self.search_id and done:
+                    running -= 1
+
+        if unfinished is not None and (best is None or unfinished.depth > best.depth):
+            yield self.combine(unfinished, nodes, start_time)
+
+    def check_workers(self):
+        """Raise RuntimeError if a worker died, since its reports would never come"""
+        if not all(worker.is_alive() for worker in self.workers):
+            raise RuntimeError("A search worker died")
+
+    def search(self, position, limits=None, stop_event=None, ponderhit_event=None):
+        """Run iterate to the end and return its last result (None without a legal move)"""
+        result = None
+        for result in self.iterate(position, limits, stop_event, ponderhit_event):
+            pass
+        return result
+
+    def combine(self, result, nodes, start_time):
+        """result with the node count and speed of all the workers"""
+        elapsed = time.time() - start_time
+        total = sum(nodes)
+        return SearchResult(result.depth, result.score, result.pv, total,
+                            int(total / elapsed) if elapsed > 0 else 0, elapsed, result.complete)
+
+
+def scaling_report(max_threads, depth, fens=REPORT_FENS, hash_size_mb=16):
+    """Time to depth and speed of 1 to max_threads workers, one line per count"""
+    print(f"Depth {depth}, {len(fens)} positions")
+    print(f"{'workers':>7} {'time':>8} {'speedup':>8} {'nodes':>9} {'nps':>8} {'nps x':>6}")
+    base_time = base_nps = None
+    for threads in range(1, max_threads + 1):
+        total_time = 0.0
+        total_nodes = 0
+        with ParallelSearch(threads, hash_size_mb) as parallel:
+            for fen in fens:
+                # Every position from an empty table
+                parallel.transposition_table.clear()
+                result = parallel.search(Position.from_fen(fen), SearchLimits(depth=depth))
+                total_time += result.elapsed
+                total_nodes += result.nodes
+        nps = total_nodes / total_time
+        if base_time is None:
+            base_time, base_nps = total_time, nps
+        print(f"{threads:>7} {total_time:>7.2f}s {base_time / total_time:>7.2f}x {total_nodes:>9} "
+              f"{int(nps):>8} {nps / base_nps:>5.2f}x")
+
+
+if __name__ == '__main__':
+    scaling_report(int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count(),
+                   int(sys.argv[2]) if len(sys.argv) > 2 else 5)
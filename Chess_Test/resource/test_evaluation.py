@@ -0,0 +1,46 @@
+"""The static evaluation is the same for both sides, seen from either one."""
+import pytest
+
+from evaluation import Evaluation
+from position import Position, START_FEN
+
+FENS = (
+    START_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    '8/8/8/4k3/8/8/8/R3K3 w - - 0 1',
+)
+
+
+def mirror(fen):
+    """fen with the board flipped top to bottom and the colors swapped"""
+    board, side, castling, ep, *counters = fen.split()
+    board = '/'.join(reversed(board.split('/'))).swapcase()
+    side = 'b' if side == 'w' else 'w'
+    castling = castling.swapcase() if castling != '-' else '-'
+    if ep != '-':
+        ep = ep[0] + str(9 - int(ep[1]))
+    return ' '.join([board, side, castling, ep, *counters])
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_sides_negate(fen):
+    position = Position.from_fen(fen)
+    assert Evaluation().evaluate(position, 'w') == -Evaluation().evaluate(position, 'b')
+    assert Evaluation().evaluate_position(position, 'w') == -Evaluation().evaluate_position(position, 'b')
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_mirrored_position(fen):
+    position = Position.from_fen(fen)
+    mirrored = Position.from_fen(mirror(fen))
+    evaluation = Evaluation()
+    assert evaluation.evaluate(mirrored, 'b') == pytest.approx(evaluation.evaluate(position, 'w'))
+    assert evaluation.evaluate(mirrored, mirrored.side_to_move) == pytest.approx(
+        evaluation.evaluate(position, position.side_to_move))
+
+
+def test_start_position_is_even():
+    assert Evaluation().evaluate(Position.from_fen(START_FEN), 'w') == 0
@@ -0,0 +1,67 @@
+"""The shared-memory ring that carries packed records between processes."""
+import multiprocessing
+import queue
+
+import pytest
+
+from ipc import RingBuffer
+
+
+@pytest.fixture
+def ring():
+    ring = RingBuffer(8, 3)
+    yield ring
+    ring.close()
+
+
+def test_first_in_first_out(ring):
+    for record in (b'one', b'two', b'three'):
+        ring.put(record)
+    # Records come back padded to the record size
+    assert [ring.get() for _ in range(3)] == [b'one\0\0\0\0\0', b'two\0\0\0\0\0', b'three\0\0\0']
+
+
+def test_full_and_empty_time_out(ring):
+    with pytest.raises(queue.Empty):
+        ring.get(timeout=0.01)
+    for _ in range(ring.capacity):
+        ring.put(b'x')
+    with pytest.raises(queue.Full):
+        ring.put(b'x', timeout=0.01)
+    ring.get()
+    ring.put(b'x', timeout=0.01)
+
+
+def test_oversized_record(ring):
+    with pytest.raises(ValueError):
+        ring.put(bytes(9))
+
+
+def test_wraparound(ring):
+    # Ten times round the three slots, never more than two records in it
+    ring.put((0).to_bytes(8, 'little'))
+    for number in range(1, 30):
+        ring.put(number.to_bytes(8, 'little'))
+        assert int.from_bytes(ring.get(), 'little') == number - 1
+    assert int.from_bytes(ring.get(), 'little') == 29
+
+
+def _echo(requests, replies):
+    replies.put(requests.get()[::-1])
+    requests.close()
+    replies.close()
+
+
+def test_across_processes():
+    requests = RingBuffer(8, 2)
+    replies = RingBuffer(8, 2)
+    try:
+        process = multiprocessing.get_context().Process(target=_echo, args=(requests, replies))
+        process.start()
+        requests.put(b'abcdefgh')
+        assert replies.get(timeout=10) == b'hgfedcba'
+        process.join(10)
+        assert process.exitcode == 0
+    finally:
+        requests.close()
+        replies.close()
@@ -0,0 +1,40 @@
+"""Perft: leaf counts of the legal move tree against published values."""
+import pytest
+
+from move_generator import MoveGenerator
+from position import Position, START_FEN
+
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+POSITION_3 = '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'
+POSITION_4 = 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1'
+POSITION_5 = 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8'
+
+# Leaf counts at depths 1, 2 and 3
+PERFT_COUNTS = (
+    (START_FEN, (20, 400, 8902)),
+    (KIWIPETE, (48, 2039, 97862)),
+    (POSITION_3, (14, 191, 2812)),
+    (POSITION_4, (6, 264, 9467)),
+    (POSITION_5, (44, 1486, 62379)),
+)
+
+
+def perft(position, depth):
+    moves = MoveGenerator(position).generate_moves()
+    if depth == 1:
+        return len(moves)
+    count = 0
+    for move in moves:
+        position.make_move(move)
+        count += perft(position, depth - 1)
+        position.unmake_move()
+    return count
+
+
+@pytest.mark.parametrize('fen, counts', PERFT_COUNTS)
+@pytest.mark.parametrize('depth', (1, 2, 3))
+def test_perft(fen, counts, depth):
+    position = Position.from_fen(fen)
+    assert perft(position, depth) == counts[depth - 1]
+    # Every move made was unmade
+    assert position.fen() == fen
@@ -0,0 +1,65 @@
+"""Round trips through the packed forms sent between processes."""
+import pytest
+
+from move_generator import MoveGenerator
+from position import Position, START_FEN, PACKED_SIZE
+from search import SearchLimits, SearchResult, PACKED_PV_LENGTH, RESULT_FORMAT, LIMITS_FORMAT
+
+FENS = (
+    START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3',
+    'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 b kq - 12 40',
+    '8/8/8/8/8/8/8/K6k w - - 99 300',
+)
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_position_round_trip(fen):
+    position = Position.from_fen(fen)
+    data = position.pack()
+    assert len(data) == PACKED_SIZE
+    unpacked = Position.unpack(data)
+    assert unpacked.fen() == fen
+    assert unpacked.key == position.key
+    assert unpacked.bitboards == position.bitboards
+
+
+def test_position_unpack_at_offset():
+    positions = [Position.from_fen(fen) for fen in FENS]
+    data = b'\xff' * 3 + b''.join(position.pack() for position in positions)
+    for index, fen in enumerate(FENS):
+        assert Position.unpack(data, 3 + index * PACKED_SIZE).fen() == fen
+
+
+def test_search_result_round_trip():
+    position = Position.from_fen(START_FEN)
+    pv = []
+    for _ in range(4):
+        move = MoveGenerator(position).generate_moves()[0]
+        pv.append(move)
+        position.make_move(move)
+    result = SearchResult(7, -35.5, pv, 123456, 78901, 1.25, complete=False)
+    data = result.pack()
+    assert len(data) == RESULT_FORMAT.size
+    unpacked = SearchResult.unpack(b'\x00' + data, 1)
+    for name in SearchResult.__slots__:
+        assert getattr(unpacked, name) == getattr(result, name)
+
+
+def test_search_result_pv_is_cut_to_its_slots():
+    result = SearchResult(1, 0, [1] * (PACKED_PV_LENGTH + 5), 0, 0, 0.0)
+    assert SearchResult.unpack(result.pack()).pv == [1] * PACKED_PV_LENGTH
+
+
+@pytest.mark.parametrize('limits', (
+    SearchLimits(),
+    SearchLimits(time_left=60.0, increment=0.5, moves_to_go=20),
+    SearchLimits(movetime=2.5, depth=8, nodes=100000),
+))
+def test_search_limits_round_trip(limits):
+    data = limits.pack()
+    assert len(data) == LIMITS_FORMAT.size
+    unpacked = SearchLimits.unpack(data)
+    for name in ('time_left', 'increment', 'moves_to_go', 'movetime', 'depth', 'nodes'):
+        assert getattr(unpacked, name) == getattr(limits, name)
@@ -0,0 +1,59 @@
+"""Repetition detection along the moves played on a Position."""
+from move_generator import MoveGenerator
+from moves import move_from_uci
+from position import Position, START_FEN
+
+
+def play(position, *ucis):
+    for uci in ucis:
+        if uci == 'null':
+            position.make_null_move()
+            continue
+        move = move_from_uci(MoveGenerator(position).generate_moves(), uci)
+        assert move is not None, uci
+        position.make_move(move)
+
+
+def test_repetition():
+    position = Position.from_fen(START_FEN)
+    play(position, 'g1f3', 'g8f6', 'f3g1')
+    assert not position.is_repetition()
+    play(position, 'f6g8')
+    assert position.is_repetition()
+
+
+def test_no_repetition_before_a_pawn_move():
+    position = Position.from_fen(START_FEN)
+    play(position, 'g1f3', 'g8f6', 'f3g1', 'f6g8', 'e2e3', 'e7e6')
+    assert not position.is_repetition()
+    play(position, 'g1f3', 'g8f6', 'f3g1', 'f6g8')
+    assert position.is_repetition()
+
+
+def test_no_repetition_across_a_null_move():
+    position = Position.from_fen(START_FEN)
+    play(position, 'g1f3', 'g8f6', 'f3g1', 'f6g8')
+    # The start position again, but only through two passes
+    play(position, 'null', 'g8f6', 'null', 'f6g8')
+    assert not position.is_repetition()
+    position.unmake_move()
+    position.unmake_null_move()
+    position.unmake_move()
+    position.unmake_null_move()
+    assert position.is_repetition()
+
+
+def test_repetition_after_a_null_move():
+    position = Position.from_fen(START_FEN)
+    play(position, 'null', 'g8f6', 'g1f3', 'f6g8', 'f3g1')
+    assert position.is_repetition()
+
+
+def test_repetition_of_a_given_history():
+    game = Position.from_fen(START_FEN)
+    play(game, 'g1f3', 'g8f6', 'f3g1')
+    # The same position, built without its moves
+    position = Position.from_fen(game.fen())
+    position.set_history(game.key_history)
+    play(position, 'f6g8')
+    assert position.is_repetition()
@@ -0,0 +1,53 @@
+"""Static exchange evaluation on known exchanges."""
+import pytest
+
+from evaluation import PIECE_VALUES
+from move_generator import MoveGenerator
+from moves import move_from_uci
+from position import Position
+from see import see, see_ge
+
+P, N, B, R, Q = (PIECE_VALUES[piece_type] for piece_type in ('P', 'N', 'B', 'R', 'Q'))
+
+# Position, move and its exchange value
+EXCHANGES = (
+    # Undefended pawn
+    ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', P),
+    # Knight takes a pawn defended by knight, bishop and an x-rayed queen
+    ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', P - N),
+    # Queen takes a pawn defended by a pawn
+    ('4k3/8/3p4/4p3/8/8/8/4QK2 w - - 0 1', 'e1e5', P - Q),
+    # Rook for rook, the king recaptures
+    ('4k3/4r3/8/8/8/8/4R3/4K3 w - - 0 1', 'e2e7', 0),
+    # Rooks doubled behind each other against a single defender
+    ('3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', P),
+    # Knight moves where a pawn takes it
+    ('4k3/8/2p5/8/3N4/8/8/4K3 w - - 0 1', 'd4b5', -N),
+    # Undefended promotion
+    ('7k/P7/8/8/8/8/8/K7 w - - 0 1', 'a7a8q', Q - P),
+    # En passant
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', P),
+    # Castling is never an exchange
+    ('4k3/8/8/8/8/8/8/4K2R w K - 0 1', 'e1g1', 0),
+)
+
+
+def find(position, uci):
+    move = move_from_uci(MoveGenerator(position).generate_moves(), uci)
+    assert move is not None, uci
+    return move
+
+
+@pytest.mark.parametrize('fen, uci, value', EXCHANGES)
+def test_see(fen, uci, value):
+    position = Position.from_fen(fen)
+    assert see(position, find(position, uci)) == value
+
+
+@pytest.mark.parametrize('fen, uci, value', EXCHANGES)
+def test_see_ge(fen, uci, value):
+    position = Position.from_fen(fen)
+    move = find(position, uci)
+    assert see_ge(position, move, value)
+    assert see_ge(position, move, value - 1)
+    assert not see_ge(position, move, value + 1)
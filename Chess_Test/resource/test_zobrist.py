@@ -0,0 +1,48 @@
+"""The incremental position key against the key computed from scratch."""
+import pytest
+
+from move_generator import MoveGenerator
+from moves import DOUBLE_PUSH
+from position import Position, START_FEN
+from test_move_generator import PERFT_COUNTS
+from zobrist import compute_key
+
+# The perft positions: castling, en passant, promotions and captures of the
+# castling rooks
+FENS = tuple(fen for fen, _ in PERFT_COUNTS)
+
+
+def check_keys(position, depth):
+    key = position.key
+    assert key == compute_key(position)
+    for move in MoveGenerator(position).generate_moves():
+        position.make_move(move)
+        if depth > 1:
+            check_keys(position, depth - 1)
+        else:
+            assert position.key == compute_key(position)
+        position.unmake_move()
+        assert position.key == key
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_make_unmake_keys(fen):
+    check_keys(Position.from_fen(fen), 2)
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_null_move_keys(fen):
+    position = Position.from_fen(fen)
+    key = position.key
+    position.make_null_move()
+    assert position.key == compute_key(position)
+    position.unmake_null_move()
+    assert position.key == key
+
+
+def test_double_push_sets_ep_key():
+    position = Position.from_fen(START_FEN)
+    move = next(move for move in MoveGenerator(position).generate_moves() if move >> 12 == DOUBLE_PUSH)
+    position.make_move(move)
+    assert position.ep_square is not None
+    assert position.key == compute_key(position)
@@ -0,0 +1,105 @@
+"""Search time allocation.
+
+A search is limited by any combination of a clock (time left, increment,
+moves to go), a fixed time per move, a fixed depth and a node count. Clock
+time is split into a soft limit, after which no new iteration is started,
+and a hard limit at which the running iteration is aborted. The clock is
+only read every check_interval nodes, and so is the optional stop event
+through which another thread can end the search at any time.
+
+A search given a ponderhit event is pondering: it ignores the clock until
+the event is set, then stops by the limits as if it had started thinking
+when it began pondering, so the time spent pondering is saved.
+
+All times are in seconds.
+"""
+import math
+import time
+
+# Moves assumed left in the game when the clock gives no moves to go
+DEFAULT_MOVES_TO_GO = 30
+# Kept back for the GUI and process overhead on every move
+MOVE_OVERHEAD = 0.05
+MIN_THINK_TIME = 0.01
+# The hard limit may stretch to this many soft limits, but never past this
+# share of the time left
+HARD_LIMIT_FACTOR = 3
+MAX_TIME_SHARE = 0.5
+CHECK_INTERVAL = 1024
+
+
+class TimeManager:
+    def __init__(self, time_left=None, increment=0.0, moves_to_go=None, movetime=None,
+                 depth=None, nodes=None, check_interval=CHECK_INTERVAL, stop_event=None, ponderhit_event=None):
+        self.time_left = time_left
+        self.increment = increment
+        self.moves_to_go = moves_to_go
+        self.movetime = movetime
+        self.max_depth = depth
+        self.max_nodes = nodes
+        self.check_interval = check_interval
+        self.stop_event = stop_event
+        self.ponderhit_event = ponderhit_event
+        self.start()
+
+    def start(self):
+        """Start the clock and compute the limits for a new search"""
+        self.start_time = time.time()
+        self.nodes = 0
+        if self.movetime is not None:
+            # A fixed time per move: stop right at it, and start no iteration
+            # past half of it since the next one would not finish
+            self.hard_limit = max(MIN_THINK_TIME, self.movetime - MOVE_OVERHEAD)
+            self.soft_limit = self.hard_limit / 2
+        elif self.time_left is not None:
+            moves_to_go = self.moves_to_go or DEFAULT_MOVES_TO_GO
+            available = max(MIN_THINK_TIME, self.time_left - MOVE_OVERHEAD)
+            self.soft_limit = min(available / moves_to_go + self.increment * 0.8,
+                                  available * MAX_TIME_SHARE)
+            self.hard_limit = min(self.soft_limit * HARD_LIMIT_FACTOR, available * MAX_TIME_SHARE)
+        else:
+            # Depth or node limits only (or nothing, until stopped)
+            self.soft_limit = self.hard_limit = math.inf
+        self.next_check = self.check_interval
+        if self.max_nodes is not None:
+            self.next_check = min(self.next_check, self.max_nodes)
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def stopped(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def pondering(self):
+        return self.ponderhit_event is not None and not self.ponderhit_event.is_set()
+
+    def can_start_iteration(self, depth):
+        """Whether there is depth and time left to begin searching depth"""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.stopped():
+            return False
+        return self.pondering() or self.elapsed() < self.soft_limit
+
+    def tick(self):
+        """Count a node; every check_interval nodes make sure no limit is hit"""
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check()
+
+    def check(self):
+        """Raise TimeoutError once the hard limit or the node limit is reached,
+        or the search is stopped"""
+        if self.stopped():
+            raise TimeoutError()
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise TimeoutError()
+        if self.elapsed() >= self.hard_limit and not self.pondering():
+            raise TimeoutError()
+        self.next_check = self.nodes + self.check_interval
+        if self.max_nodes is not None:
+            self.next_check = min(self.next_check, self.max_nodes)
+
+    def nps(self):
+        elapsed = self.elapsed()
+        return int(self.nodes / elapsed) if elapsed > 0 else 0
@@ -0,0 +1,136 @@
+"""Fixed-size transposition table.
+
+The table is a flat array of 64-bit words grouped in buckets of two entries.
+The first entry of a bucket is depth-preferred: it is only replaced by a
+search at least as deep, or once it is left over from an older search. The
+second entry is always replaced. Every entry is two words, the key XORed with
+the data and the data itself, so a torn write never matches the key on a
+probe. That also makes the table safe to share between processes without a
+lock: the words can live in any writable buffer, such as the buf of a
+multiprocessing.shared_memory.SharedMemory.
+
+Data layout:
+bits 0-15   best move (NULL_MOVE when none)
+bits 16-17  bound type
+bits 18-25  depth
+bits 26-33  age (search counter)
+bits 34-63  score + SCORE_OFFSET
+"""
+from array import array
+
+from moves import NULL_MOVE
+
+EXACT = 1
+LOWER = 2  # Fail high: the score is a lower bound
+UPPER = 3  # Fail low: the score is an upper bound
+
+ENTRY_WORDS = 2
+BUCKET_WORDS = 2 * ENTRY_WORDS
+BUCKET_BYTES = BUCKET_WORDS * 8
+SCORE_OFFSET = 1 << 29
+SCORE_LIMIT = SCORE_OFFSET - 1
+# Buckets sampled for the fill estimate
+FILL_SAMPLE = 1000
+
+
+class TTEntry:
+    __slots__ = ('move', 'bound', 'depth', 'score')
+
+    def __init__(self, move, bound, depth, score):
+        self.move = move
+        self.bound = bound
+        self.depth = depth
+        self.score = score
+
+
+def table_bytes(size_mb):
+    """Bytes used by a table of size_mb megabytes, rounded down to whole buckets"""
+    return max(1, size_mb * 1024 * 1024 // BUCKET_BYTES) * BUCKET_BYTES
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, buffer=None):
+        if buffer is None:
+            self.resize(size_mb)
+        else:
+            self.attach(buffer)
+
+    def resize(self, size_mb):
+        self.size_mb = size_mb
+        self.bucket_count = table_bytes(size_mb) // BUCKET_BYTES
+        self.table = array('Q', bytes(self.bucket_count * BUCKET_BYTES))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def attach(self, buffer):
+        """Keep the table in buffer (shared with other processes) as it is,
+        without clearing it"""
+        self.table = memoryview(buffer).cast('Q')
+        self.bucket_count = len(self.table) // BUCKET_WORDS
+        self.size_mb = self.bucket_count * BUCKET_BYTES / (1024 * 1024)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        # In place, since the words may be shared
+        memoryview(self.table).cast('B')[:] = bytes(self.bucket_count * BUCKET_BYTES)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """Age the table so entries from earlier searches get replaced first"""
+        self.age = (self.age + 1) & 0xFF
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        """TTEntry stored for key, or None"""
+        table = self.table
+        index = (key % self.bucket_count) * BUCKET_WORDS
+        self.probes += 1
+        for slot in (index, index + ENTRY_WORDS):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                self.hits += 1
+                return TTEntry(data & 0xFFFF, (data >> 16) & 3, (data >> 18) & 0xFF,
+                               (data >> 34) - SCORE_OFFSET)
+        return None
+
+    def store(self, key, depth, bound, score, move=NULL_MOVE):
+        table = self.table
+        index = (key % self.bucket_count) * BUCKET_WORDS
+        first = table[index + 1]
+        if table[index] ^ first == key and first:
+            slot = index
+            if not move:
+                move = first & 0xFFFF  # Keep the old best move
+        elif not first or depth >= (first >> 18) & 0xFF or (first >> 26) & 0xFF != self.age:
+            slot = index
+        else:
+            slot = index + ENTRY_WORDS
+            second = table[slot + 1]
+            if not move and second and table[slot] ^ second == key:
+                move = second & 0xFFFF
+
+        score = max(-SCORE_LIMIT, min(SCORE_LIMIT, round(score)))
+        data = (move | (bound << 16) | (min(depth, 0xFF) << 18) | (self.age << 26)
+                | ((score + SCORE_OFFSET) << 34))
+        table[slot] = key ^ data
+        table[slot + 1] = data
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def fill(self):
+        """Fraction of entries written by the current search (sampled)"""
+        table = self.table
+        sample = min(FILL_SAMPLE, self.bucket_count) * BUCKET_WORDS
+        used = 0
+        for slot in range(0, sample, ENTRY_WORDS):
+            data = table[slot + 1]
+            if data and (data >> 26) & 0xFF == self.age:
+                used += 1
+        return used / (sample // ENTRY_WORDS)
@@ -0,0 +1,36 @@
+"""Zobrist keys.
+
+A position key is the XOR of one random 64-bit number per (piece, square),
+one for the side to move when Black is to move, one per castling rights mask
+and one for the file of the en passant square. The numbers come from a fixed
+seed so keys are the same in every process.
+"""
+import random
+
+_rng = random.Random(0x5EED)
+
+PIECE_KEYS = {
+    color + piece_type: [_rng.getrandbits(64) for _ in range(64)]
+    for color in ('w', 'b') for piece_type in ('P', 'N', 'B', 'R', 'Q', 'K')
+}
+SIDE_KEY = _rng.getrandbits(64)
+# Indexed by the whole castling mask so a rights change is a single XOR pair
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+EP_FILE_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def compute_key(position):
+    """Key of a position computed from scratch"""
+    key = 0
+    for piece, bitboard in position.bitboards.items():
+        piece_keys = PIECE_KEYS[piece]
+        while bitboard:
+            low = bitboard & -bitboard
+            key ^= piece_keys[low.bit_length() - 1]
+            bitboard ^= low
+    if position.side_to_move == 'b':
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square is not None:
+        key ^= EP_FILE_KEYS[position.ep_square & 7]
+    return key